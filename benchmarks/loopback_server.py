@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import random
+import socket
+import struct
+import sys
+import time
+from urllib.parse import urlsplit, parse_qs
+
+# Local stand-in for the public servers used by utils/network_tests.py, so
+# measurement accuracy can be checked offline against known link properties.
+#
+#   python benchmarks/loopback_server.py --rate-mbps 50 --delay-ms 20 --jitter-ms 5 --loss 2
+#
+# HTTP (one port, keep-alive):
+#   GET  /down?bytes=N   N bytes of payload (default: effectively endless); a single
+#                        Range (bytes=a-b, a- or -n) gets a 206 with that slice
+#   POST /up             sink; reads the whole body and answers 200
+#   GET  /echo           tiny body, for keep-alive latency samples
+# UDP (second port):
+#   DNS stand-in; A queries get 127.0.0.1, anything else an empty answer, so it
+#   serves both test_dns and the UDP ping probe.
+#
+# Shaping: --rate-mbps is one token bucket per direction shared by all connections,
+# --delay-ms (+/- uniform --jitter-ms) is added before every HTTP response and UDP
+# reply, --loss drops that percentage of UDP replies. TCP loss can't be emulated
+# from user space, so HTTP traffic is only rate limited and delayed.
+#
+# On start one JSON line with the bound ports is printed to stdout.
+
+CHUNK_SIZE = 64 * 1024
+# the rate limit sits behind the kernel receive buffer, and the kernel acknowledges
+# whatever lands in that buffer; kept small so uploads are acknowledged at about
+# the shaped rate, as they are by a far-end receiver behind a real bottleneck
+RECV_BUFFER = 64 * 1024
+ENDLESS = 1 << 40
+PAYLOAD = random.randbytes(CHUNK_SIZE)
+
+class TokenBucket:
+    # a virtual queue: every chunk reserves its serialisation time at the
+    # configured rate and sleeps until its slot has passed
+    def __init__(self, rate_mbps):
+        self.rate = rate_mbps * 1_000_000 / 8 if rate_mbps else 0
+        self.next_free = 0.0
+
+    async def consume(self, n):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self.next_free = max(now, self.next_free) + n / self.rate
+        if self.next_free - now > 0.001:
+            await asyncio.sleep(self.next_free - now)
+
+class Shaping:
+    def __init__(self, rate_mbps=0, delay_ms=0, jitter_ms=0, loss=0):
+        self.rate_mbps = rate_mbps
+        self.delay_ms = delay_ms
+        self.jitter_ms = jitter_ms
+        self.loss = loss
+        self.down = TokenBucket(rate_mbps)
+        self.up = TokenBucket(rate_mbps)
+
+    def delay(self):
+        return max(0.0, self.delay_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def drop(self):
+        return random.random() * 100 < self.loss
+
+async def _read_request(reader):
+    head = await reader.readuntil(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    return method, target, headers
+
+def _response_head(status, length, content_type="application/octet-stream", extra=""):
+    reason = {200: "OK", 206: "Partial Content", 404: "Not Found", 405: "Method Not Allowed",
+              416: "Range Not Satisfiable"}[status]
+    return (
+        f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {length}\r\n{extra}Connection: keep-alive\r\n\r\n"
+    ).encode()
+
+def _parse_range(value, size):
+    # (first, last) of a single "bytes=" range, False if it can't be satisfied,
+    # None when there is no usable Range header (multiple ranges are ignored too)
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    first, _, last = value[6:].strip().partition("-")
+    try:
+        if not first:
+            n = int(last)
+            return (max(0, size - n), size - 1) if n > 0 else False
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    return (first, last) if first <= last else False
+
+async def _send_payload(writer, size, bucket):
+    while size > 0:
+        n = min(size, CHUNK_SIZE)
+        await bucket.consume(n)
+        writer.write(PAYLOAD[:n])
+        await writer.drain()
+        size -= n
+
+async def _sink_body(reader, size, bucket):
+    while size > 0:
+        data = await reader.read(min(size, CHUNK_SIZE))
+        if not data:
+            raise ConnectionResetError()
+        await bucket.consume(len(data))
+        size -= len(data)
+
+async def _handle_http(reader, writer, shaping):
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER)
+    try:
+        while True:
+            method, target, headers = await _read_request(reader)
+            url = urlsplit(target)
+            length = int(headers.get("content-length") or 0)
+
+            if method == "POST" and url.path == "/up":
+                await _sink_body(reader, length, shaping.up)
+                await asyncio.sleep(shaping.delay())
+                body = json.dumps({"received": length}).encode()
+                writer.write(_response_head(200, len(body), "application/json") + body)
+            elif method == "GET" and url.path == "/down":
+                size = int(parse_qs(url.query).get("bytes", [ENDLESS])[0])
+                span = _parse_range(headers.get("range"), size)
+                await asyncio.sleep(shaping.delay())
+                if span is False:
+                    writer.write(_response_head(416, 0, extra=f"Content-Range: bytes */{size}\r\n"))
+                elif span:
+                    first, last = span
+                    writer.write(_response_head(206, last - first + 1, extra=f"Content-Range: bytes {first}-{last}/{size}\r\n"))
+                    await _send_payload(writer, last - first + 1, shaping.down)
+                else:
+                    writer.write(_response_head(200, size))
+                    await _send_payload(writer, size, shaping.down)
+            elif method == "GET" and url.path == "/echo":
+                await asyncio.sleep(shaping.delay())
+                writer.write(_response_head(200, 2, "text/plain") + b"ok")
+            else:
+                await _sink_body(reader, length, shaping.up)
+                status = 405 if url.path in ("/up", "/down", "/echo") else 404
+                writer.write(_response_head(status, 0))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+        # clients routinely drop the connection mid-body when a timed test ends
+        pass
+    finally:
+        writer.close()
+
+def _dns_reply(query):
+    # echoes the question back; A/IN questions get one 127.0.0.1 answer
+    query_id, _, qdcount = struct.unpack("!HHH", query[:6])
+    end = 12
+    while query[end]:
+        end += query[end] + 1
+    end += 5
+    qtype, = struct.unpack("!H", query[end - 4:end - 2])
+    answer = b""
+    if qdcount == 1 and qtype == 1:
+        answer = b"\xc0\x0c" + struct.pack("!HHIH", 1, 1, 60, 4) + bytes([127, 0, 0, 1])
+    header = struct.pack("!HHHHHH", query_id, 0x8180, 1, 1 if answer else 0, 0, 0)
+    return header + query[12:end] + answer
+
+class DnsStandIn(asyncio.DatagramProtocol):
+    def __init__(self, shaping):
+        self.shaping = shaping
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            reply = _dns_reply(data)
+        except (IndexError, struct.error):
+            return
+        if self.shaping.drop():
+            return
+        asyncio.get_running_loop().call_later(self.shaping.delay(), self.transport.sendto, reply, addr)
+
+async def serve(host="127.0.0.1", port=0, udp_port=0, shaping=None, ready=None):
+    shaping = shaping or Shaping()
+    loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(lambda r, w: _handle_http(r, w, shaping), host, port)
+    transport, _ = await loop.create_datagram_endpoint(lambda: DnsStandIn(shaping), local_addr=(host, udp_port))
+    ports = {"http": server.sockets[0].getsockname()[1], "udp": transport.get_extra_info("sockname")[1]}
+    if ready:
+        ready(ports)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        transport.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local loopback speed-test server with traffic shaping")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=0, help="HTTP port (0 = any free port)")
+    parser.add_argument("--udp-port", type=int, default=0, help="DNS/UDP port (0 = any free port)")
+    parser.add_argument("--rate-mbps", type=float, default=0, help="per-direction rate limit, 0 = unlimited")
+    parser.add_argument("--delay-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--loss", type=float, default=0, help="percentage of UDP replies dropped")
+    args = parser.parse_args(argv)
+
+    shaping = Shaping(args.rate_mbps, args.delay_ms, args.jitter_ms, args.loss)
+
+    def ready(ports):
+        print(json.dumps(ports), flush=True)
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.udp_port, shaping, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
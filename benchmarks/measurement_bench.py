@@ -0,0 +1,161 @@
+import argparse
+import contextlib
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Offline accuracy/overhead check for the measurement code in utils/network_tests.py.
+# Each profile starts benchmarks/loopback_server.py with known shaping, points the
+# tests at it and compares what they measure with what was configured.
+#
+#   python benchmarks/measurement_bench.py                        all profiles
+#   python benchmarks/measurement_bench.py -p broadband -t download upload
+#   python benchmarks/measurement_bench.py --tolerance 10         exit 1 above 10% error
+#
+# The server runs in its own process, so the CPU column is the measuring side only.
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# name: (rate Mbps, delay ms, jitter ms, UDP loss %)
+PROFILES = {
+    'fast': (200, 2, 0, 0),
+    'broadband': (50, 20, 3, 0),
+    'mobile': (10, 60, 15, 3),
+}
+TESTS = ['download', 'upload', 'jitter', 'ping', 'dns']
+# absolute error allowed on top of --tolerance, per unit; random loss over a few
+# dozen probes and scheduler noise on loopback latencies need some room
+SLACK = {'Mbps': 0.0, 'ms': 2.0, '%': 5.0}
+
+class _Collector:
+    def __init__(self, echo):
+        self.lines = []
+        self.echo = echo
+
+    def emit(self, text):
+        self.lines.append(text)
+        if self.echo:
+            sys.stderr.write(text)
+
+@contextlib.contextmanager
+def loopback_server(rate, delay, jitter, loss):
+    proc = subprocess.Popen(
+        [sys.executable, str(ROOT / "benchmarks" / "loopback_server.py"),
+         "--rate-mbps", str(rate), "--delay-ms", str(delay),
+         "--jitter-ms", str(jitter), "--loss", str(loss)],
+        stdout=subprocess.PIPE, text=True
+    )
+    try:
+        line = proc.stdout.readline()
+        if not line:
+            raise SystemExit("loopback server failed to start")
+        yield json.loads(line)
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def point_tests_at(nt, ping_engine, ports):
+    base = f"http://127.0.0.1:{ports['http']}"
+    nt.DOWNLOAD_SERVERS = [("loopback", f"{base}/down")]
+    nt.UPLOAD_SERVERS = [("loopback", f"{base}/up")]
+    nt.JITTER_URL = f"{base}/echo"
+    # ICMP to 127.0.0.1 bypasses the shaping, so latency goes through the server
+    nt.icmp_available = lambda: False
+    nt.get_system_dns = lambda: "Unknown"
+    nt.DNS_PORT = ports['udp']
+    ping_engine.UDP_PROBE_PORT = ports['udp']
+
+def run_tests(nt, tests, profile, args, out):
+    rate, delay, jitter, loss = profile
+    rows = []
+
+    def timed(fn):
+        cpu, wall = time.process_time(), time.monotonic()
+        result = fn()
+        return result, time.process_time() - cpu, time.monotonic() - wall
+
+    if 'download' in tests:
+        (speed, _), cpu, wall = timed(lambda: nt.test_download(out, args.streams, args.duration))
+        rows.append(('download', 'throughput', 'Mbps', rate or None, speed, cpu, wall))
+    if 'upload' in tests:
+        (speed, _), cpu, wall = timed(lambda: nt.test_upload(out, args.streams, 25, args.duration))
+        rows.append(('upload', 'throughput', 'Mbps', rate or None, speed, cpu, wall))
+    if 'jitter' in tests:
+        (rfc, _, samples), cpu, wall = timed(lambda: nt.test_jitter(out, args.jitter_samples))
+        p50 = nt.percentile(sorted(samples), 50) if samples else 0
+        rows.append(('jitter', 'latency p50', 'ms', delay, p50, cpu, wall))
+        # mean |D| of two independent uniform(-j, j) draws is 2j/3
+        rows.append(('jitter', 'RFC 3550', 'ms', jitter * 2 / 3, rfc, 0, 0))
+    if 'ping' in tests:
+        (_, lost, stats), cpu, wall = timed(lambda: nt.test_ping(out, ["127.0.0.1"], args.ping_count, method='udp'))
+        rows.append(('ping', 'p50', 'ms', delay, stats["127.0.0.1"]['p50'], cpu, wall))
+        rows.append(('ping', 'loss', '%', loss, lost, 0, 0))
+    if 'dns' in tests:
+        (_, _, dns_rows), cpu, wall = timed(lambda: nt.test_dns(out, ["127.0.0.1"]))
+        for row in dns_rows:
+            rows.append(('dns', f"{row['kind']} p50", 'ms', delay, row['p50'] or 0, cpu if row['kind'] == 'cold' else 0, 0))
+    return rows
+
+def _over_tolerance(unit, configured, measured, tolerance):
+    if configured is None:
+        return False
+    return abs(measured - configured) > configured * tolerance / 100 + SLACK[unit]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check FluxFlow measurement accuracy against a shaped loopback server")
+    parser.add_argument("-p", "--profile", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("-t", "--tests", nargs="+", choices=TESTS, default=TESTS)
+    parser.add_argument("--duration", type=float, default=8, help="seconds per throughput direction")
+    parser.add_argument("--streams", type=int, default=4)
+    parser.add_argument("--jitter-samples", type=int, default=200)
+    parser.add_argument("--ping-count", type=int, default=40)
+    parser.add_argument("--tolerance", type=float, help="fail when an error exceeds this many percent (plus SLACK)")
+    parser.add_argument("--json", action="store_true", help="print the rows as JSON instead of a table")
+    parser.add_argument("-v", "--verbose", action="store_true", help="echo the tests' own output to stderr")
+    args = parser.parse_args(argv)
+
+    import database
+    from utils import network_tests as nt, ping_engine
+
+    # server health and results go to a scratch database, never the user's
+    tmp = tempfile.TemporaryDirectory()
+    database.DB_PATH = Path(tmp.name) / "bench.db"
+    with contextlib.redirect_stdout(sys.stderr):
+        database.init_db()
+
+    out = _Collector(args.verbose)
+    report = []
+    for name in args.profile:
+        with loopback_server(*PROFILES[name]) as ports:
+            point_tests_at(nt, ping_engine, ports)
+            for test, metric, unit, configured, measured, cpu, wall in run_tests(nt, args.tests, PROFILES[name], args, out):
+                report.append({
+                    'profile': name, 'test': test, 'metric': metric, 'unit': unit,
+                    'configured': configured, 'measured': round(measured, 3),
+                    'error': None if configured is None else round(measured - configured, 3),
+                    'cpu_seconds': round(cpu, 3), 'cpu_share': round(cpu / wall, 3) if wall else None,
+                    'failed': args.tolerance is not None and _over_tolerance(unit, configured, measured, args.tolerance),
+                })
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'profile':<10} {'test':<9} {'metric':<18} {'configured':>11} {'measured':>10} {'error':>9} {'CPU s':>7} {'CPU %':>6}")
+        for r in report:
+            configured = "-" if r['configured'] is None else f"{r['configured']:.2f}"
+            error = "-" if r['error'] is None else f"{r['error']:+.2f}"
+            share = "" if r['cpu_share'] is None else f"{r['cpu_share'] * 100:.0f}"
+            flag = "  FAIL" if r['failed'] else ""
+            print(
+                f"{r['profile']:<10} {r['test']:<9} {r['metric'] + ' (' + r['unit'] + ')':<18} "
+                f"{configured:>11} {r['measured']:>10.2f} {error:>9} {r['cpu_seconds']:>7.2f} {share:>6}{flag}"
+            )
+    tmp.cleanup()
+    return 1 if any(r['failed'] for r in report) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
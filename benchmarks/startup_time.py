@@ -0,0 +1,64 @@
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+# Cold-start import report for FluxFlow, built on `python -X importtime`.
+#
+#   python benchmarks/startup_time.py                      GUI module (ui.main_window)
+#   python benchmarks/startup_time.py -m cli --budget 150  fail (exit 1) above 150 ms
+#
+# Each run is a fresh interpreter; the fastest of --runs is reported so disk cache
+# noise doesn't show up as a regression.
+
+ROOT = Path(__file__).resolve().parent.parent
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+WATCH = ['pandas', 'matplotlib', 'requests', 'dns', 'urllib3', 'PyQt6', 'openpyxl']
+
+def measure(module):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    entries = []
+    for line in proc.stderr.splitlines():
+        m = LINE.match(line)
+        if m:
+            depth = (len(m.group(3)) - 1) // 2
+            entries.append((m.group(4), int(m.group(1)), int(m.group(2)), depth))
+    return entries
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure FluxFlow import-time startup cost")
+    parser.add_argument("-m", "--module", default="ui.main_window")
+    parser.add_argument("-n", "--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget", type=float, help="fail when total import time exceeds this many ms")
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module) for _ in range(max(1, args.runs))]
+    totals = [sum(cum for _, _, cum, depth in run if depth == 0) for run in runs]
+    best = runs[totals.index(min(totals))]
+    total_ms = min(totals) / 1000
+
+    print(f"import {args.module}: {total_ms:.1f} ms (best of {len(runs)}, {len(best)} modules)")
+    # depth 1-2 are the measured module's own imports and what they pull in directly
+    print(f"\n{'cumulative':>12} {'self':>10}  module")
+    nested = sorted((e for e in best if 1 <= e[3] <= 2), key=lambda e: e[2], reverse=True)
+    for name, self_us, cum_us, depth in nested[:args.top]:
+        print(f"{cum_us / 1000:10.1f}ms {self_us / 1000:8.1f}ms  {'  ' * (depth - 1)}{name}")
+
+    loaded = {name.split('.')[0] for name, *_ in best}
+    heavy = [w for w in WATCH if w in loaded]
+    print(f"\nheavy packages loaded at startup: {', '.join(heavy) or 'none'}")
+
+    if args.budget is not None and total_ms > args.budget:
+        print(f"FAIL: {total_ms:.1f} ms exceeds the {args.budget:.1f} ms budget")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
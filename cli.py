@@ -0,0 +1,89 @@
+import argparse
+import contextlib
+import json
+import random
+import sys
+import time
+from database import init_db, flush_writes, close_connection
+from retention import start_retention
+from runner import TestRunner, load_settings
+
+# headless entry point for probe servers and cron:
+#   python cli.py                       one test, JSON on stdout
+#   python cli.py --daemon -i 300 -o 60 one test every 5 min, each start delayed by 0-60 s
+# progress and any library prints go to stderr so stdout stays machine-readable
+
+TESTS = ['download', 'upload', 'jitter', 'ping', 'dns', 'location', 'loaded_latency']
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="fluxflow", description="FluxFlow headless network tester")
+    parser.add_argument("--only", help=f"comma-separated subset of: {', '.join(TESTS)}")
+    parser.add_argument("--settings", help="JSON file with setting overrides")
+    parser.add_argument("--daemon", action="store_true", help="keep running tests on a schedule")
+    parser.add_argument("-i", "--interval", type=float, default=300, help="seconds between daemon runs")
+    parser.add_argument("-o", "--offset", type=float, default=30,
+                        help="max random delay (s) added to each daemon run so probes don't align")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no progress output on stderr")
+    parser.add_argument("--pretty", action="store_true", help="indent the JSON output")
+    return parser.parse_args(argv)
+
+def build_settings(args):
+    settings = load_settings()
+    if args.settings:
+        with open(args.settings, encoding='utf-8') as f:
+            settings.update(json.load(f))
+    if args.only:
+        wanted = {t.strip() for t in args.only.split(',') if t.strip()}
+        unknown = wanted - set(TESTS)
+        if unknown:
+            raise SystemExit(f"Unknown test(s): {', '.join(sorted(unknown))}")
+        for test in TESTS:
+            settings[f'{test}_enabled'] = test in wanted
+    return settings
+
+def run_once(settings, out, quiet=False, pretty=False, defer_save=False):
+    def log(text):
+        if not quiet:
+            print(text.rstrip("\n"), file=sys.stderr, flush=True)
+
+    results = TestRunner(settings, on_output=log, defer_save=defer_save).run()
+    if results is None:
+        return False
+    print(json.dumps(results, ensure_ascii=False, indent=2 if pretty else None), file=out, flush=True)
+    return True
+
+def main(argv=None):
+    args = parse_args(argv)
+    settings = build_settings(args)
+    out = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        return serve(args, settings, out)
+
+def serve(args, settings, out):
+    init_db()
+
+    if not args.daemon:
+        return 0 if run_once(settings, out, args.quiet, args.pretty) else 1
+
+    next_run = time.monotonic()
+    try:
+        while True:
+            delay = next_run + random.uniform(0, args.offset) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            # the daemon doesn't wait for its writes: results go through the batch
+            # writer, so a reader holding the database never delays the schedule
+            run_once(settings, out, args.quiet, args.pretty, defer_save=True)
+            start_retention(settings)
+            # the schedule advances by whole intervals so a slow run doesn't drift it
+            next_run += args.interval
+            while next_run <= time.monotonic():
+                next_run += args.interval
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        flush_writes()
+        close_connection()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -14,15 +14,26 @@ FLAG_EMOJIS = {
 }
 
 PAGE_SIZE = 100
+GRAPH_MAX_POINTS = 400   # above this the graph reads hourly/daily rollups instead of raw rows
 
 DEFAULT_SETTINGS = {
     'download_enabled': True,
     'upload_enabled': True,
     'jitter_enabled': True,
-    'jitter_samples': 10,
+    'jitter_samples': 200,
+    'download_streams': 4,
+    'upload_streams': 4,
+    'upload_size_mb': 25,
+    'test_duration': 10,
     'ping_enabled': True,
+    'loaded_latency_enabled': True,
     'dns_enabled': True,
-    'location_enabled': True
+    'dns_resolvers': ['1.1.1.1', '8.8.8.8', '9.9.9.9'],
+    'location_enabled': True,
+    'geo_cache_minutes': 60,
+    'retention_raw_days': 0,
+    'retention_hourly_days': 0,
+    'retention_daily_days': 0
 }
 
 # استایل کامل از کد اصلیت
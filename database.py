@@ -1,43 +1,867 @@
+import atexit
+import math
+import queue
 import sqlite3
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
 from config import DB_PATH
 
+HEALTH_ALPHA = 0.3  # weight of the newest observation in the server health EWMA
+
+STATEMENT_CACHE_SIZE = 256     # prepared statements kept per connection, keyed by SQL text
+BUSY_TIMEOUT_MS = 5000
+WRITE_BATCH_SIZE = 64          # results written per transaction by the batch writer
+WRITE_FLUSH_INTERVAL = 2.0     # seconds a queued result may wait for company
+
+# applied to every new connection; WAL lets the daemon write while the GUI reads
+PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',       # durable at checkpoints, no fsync per commit in WAL
+    'PRAGMA cache_size=-16000',        # 16 MB page cache
+    'PRAGMA mmap_size=67108864',       # 64 MB memory-mapped reads
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA foreign_keys=ON',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+]
+
+_local = threading.local()
+
+def get_connection():
+    # one long-lived connection per thread (sqlite3 objects are not shared across
+    # threads); `with get_connection() as conn:` commits or rolls back but keeps it
+    # open, so the statement cache survives between calls
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=STATEMENT_CACHE_SIZE)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    _local.conn, _local.path = conn, DB_PATH
+    _local.lookup_ids = {}
+    return conn
+
+def close_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+# the repeated text of a test row lives once in a small lookup table per column;
+# tests keeps only the integer id (<column>_id) and tests_view joins the text back
+LOOKUP_TABLES = {
+    'country': 'countries',
+    'isp': 'isps',
+    'ip_address': 'ip_addresses',
+    'dns_server': 'dns_servers',
+}
+
+TESTS_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT NOT NULL,
+        download REAL, upload REAL, jitter REAL, ping REAL,
+        packet_loss REAL,
+        country_id INTEGER REFERENCES countries(id),
+        isp_id INTEGER REFERENCES isps(id),
+        ip_address_id INTEGER REFERENCES ip_addresses(id),
+        dns REAL,
+        dns_server_id INTEGER REFERENCES dns_servers(id),
+        idle_latency REAL, loaded_latency_down REAL, loaded_latency_up REAL,
+        bufferbloat REAL, bufferbloat_grade TEXT,
+        ts_ms INTEGER
+    )
+'''
+
+# tests with the looked-up text under the original column names; every read
+# that shows or exports rows goes through it
+TESTS_VIEW = '''
+    CREATE VIEW IF NOT EXISTS tests_view AS
+    SELECT t.id, t.timestamp, t.ts_ms, t.download, t.upload, t.jitter, t.ping, t.packet_loss,
+           c.name AS country, i.name AS isp, a.name AS ip_address, t.dns, s.name AS dns_server,
+           t.idle_latency, t.loaded_latency_down, t.loaded_latency_up,
+           t.bufferbloat, t.bufferbloat_grade,
+           t.country_id, t.isp_id, t.ip_address_id, t.dns_server_id
+    FROM tests t
+    LEFT JOIN countries c ON c.id = t.country_id
+    LEFT JOIN isps i ON i.id = t.isp_id
+    LEFT JOIN ip_addresses a ON a.id = t.ip_address_id
+    LEFT JOIN dns_servers s ON s.id = t.dns_server_id
+'''
+
+# columns added after the first release; older databases get them via ALTER TABLE
+TESTS_EXTRA_COLUMNS = {
+    'idle_latency': 'REAL',
+    'loaded_latency_down': 'REAL',
+    'loaded_latency_up': 'REAL',
+    'bufferbloat': 'REAL',
+    'bufferbloat_grade': 'TEXT',
+    'ts_ms': 'INTEGER',
+}
+
+# hourly/daily aggregates per ISP, kept current by every insert so long ranges
+# never have to touch the raw rows
+ROLLUP_LEVELS = {'hourly': 'rollup_hourly', 'daily': 'rollup_daily'}
+ROLLUP_METRICS = ['download', 'upload', 'ping', 'jitter', 'packet_loss', 'dns']
+HIST_BINS = 128
+HIST_RATIO = 1.1    # bin i covers log1p(value) in [i, i+1) * log(1.1): p95 within ~5%
+ROLLUP_FIELDS = [f'{m}_{f}' for m in ROLLUP_METRICS for f in ('n', 'sum', 'min', 'max', 'hist')]
+ROLLUPS_VERSION = 1    # PRAGMA user_version from which the rollups are known to be initialised
+
+# the columns the Summary table, export and graph read, so time-ordered and
+# time-range queries are answered from the index alone (plus the lookup tables)
+SUMMARY_COLUMNS = 'download, upload, jitter, ping, packet_loss, country_id, isp_id, ip_address_id, dns, dns_server_id'
+
+# text columns the Summary search box looks in; the term is matched against
+# their lookup tables, never against the tests rows themselves
+SEARCH_COLUMNS = ['country', 'isp', 'ip_address', 'dns_server']
+SEARCH_SORT_MAX = 2000    # a term matching at most this many tests is sorted, not scanned for
+
+def _add_missing_columns(conn, table, columns):
+    existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {decl}')
+
+def _round_or_none(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+# `timestamp` stays the local-time ISO text it always was; `ts_ms` is the same
+# instant as integer epoch milliseconds and is what queries filter and order by
+def epoch_ms(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return round(value.timestamp() * 1000)
+
+def from_epoch_ms(ms):
+    return datetime.fromtimestamp(ms / 1000)
+
+def _enable_incremental_vacuum(conn):
+    # lets retention hand freed pages back in small steps instead of a full VACUUM;
+    # switching an existing file over needs one VACUUM, done once here
+    if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+
+def _intern(conn, column, name):
+    # id of name in the column's lookup table, adding it on first sight; the
+    # per-connection cache means a known value costs no query at all
+    if name is None:
+        return None
+    ids = _local.lookup_ids
+    key = (column, name)
+    value_id = ids.get(key)
+    if value_id is None:
+        table = LOOKUP_TABLES[column]
+        conn.execute(f'INSERT OR IGNORE INTO {table} (name) VALUES (?)', (name,))
+        value_id = ids[key] = conn.execute(f'SELECT id FROM {table} WHERE name = ?', (name,)).fetchone()[0]
+    return value_id
+
+def _forget_interned():
+    # after a rollback the cache may hold ids that were never committed
+    if getattr(_local, 'lookup_ids', None):
+        _local.lookup_ids = {}
+
+def _migrate_to_lookup_tables(conn):
+    # rebuilds a tests table that still stores the text columns: fills the lookup
+    # tables, copies every row with ids in their place (same ids, so dns_results
+    # and samples stay attached) and swaps the new table in. The rollup tables
+    # move from the ISP name to isp_id the same way; they can't be recomputed
+    # because retention may already have pruned the raw rows behind them.
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(tests)')}
+    if 'isp' not in columns:
+        return
+    print("[DB] Moving ISP/country/IP/DNS server text into lookup tables...")
+    # dropping the old tests table must not cascade into dns_results and samples;
+    # foreign_keys can only be switched outside a transaction
+    conn.commit()
+    conn.execute('PRAGMA foreign_keys=OFF')
+    try:
+        with conn:
+            for column, table in LOOKUP_TABLES.items():
+                conn.execute(f'''
+                    INSERT OR IGNORE INTO {table} (name)
+                    SELECT DISTINCT {column} FROM tests WHERE {column} IS NOT NULL
+                ''')
+            rollups = [table for table in ROLLUP_LEVELS.values() if conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()]
+            for table in rollups:
+                conn.execute(f'INSERT OR IGNORE INTO isps (name) SELECT DISTINCT isp FROM {table}')
+            conn.execute('DROP TABLE IF EXISTS tests_fts')
+            conn.execute('DROP VIEW IF EXISTS tests_view')
+            conn.execute('DROP TABLE IF EXISTS tests_new')
+            conn.execute(TESTS_SCHEMA.format(name='tests_new'))
+            copied = ['id', 'timestamp', 'download', 'upload', 'jitter', 'ping', 'packet_loss', 'dns',
+                      *TESTS_EXTRA_COLUMNS]
+            conn.execute(f'''
+                INSERT INTO tests_new ({", ".join(copied)}, {", ".join(f"{c}_id" for c in LOOKUP_TABLES)})
+                SELECT {", ".join(f"t.{c}" for c in copied)}, {", ".join(f"l{i}.id" for i in range(len(LOOKUP_TABLES)))}
+                FROM tests t
+                {" ".join(f"LEFT JOIN {table} l{i} ON l{i}.name = t.{column}"
+                          for i, (column, table) in enumerate(LOOKUP_TABLES.items()))}
+            ''')
+            conn.execute('DROP TABLE tests')
+            conn.execute('ALTER TABLE tests_new RENAME TO tests')
+            for table in rollups:
+                _create_rollup_table(conn, f'{table}_new')
+                conn.execute(f'''
+                    INSERT INTO {table}_new (bucket_ms, isp_id, count, {", ".join(ROLLUP_FIELDS)})
+                    SELECT r.bucket_ms, i.id, r.count, {", ".join(f"r.{f}" for f in ROLLUP_FIELDS)}
+                    FROM {table} r JOIN isps i ON i.name = r.isp
+                ''')
+                conn.execute(f'DROP TABLE {table}')
+                conn.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+            problems = conn.execute('PRAGMA foreign_key_check').fetchall()
+            if problems:
+                raise sqlite3.IntegrityError(f"foreign key check failed after migration: {problems[:5]}")
+    finally:
+        conn.execute('PRAGMA foreign_keys=ON')
+    # the old table's pages are free now; hand them back in one go
+    conn.execute('VACUUM')
+
+def _create_rollup_table(conn, table):
+    metric_columns = ', '.join(
+        f'{m}_n INTEGER NOT NULL DEFAULT 0, {m}_sum REAL, {m}_min REAL, {m}_max REAL, {m}_hist BLOB'
+        for m in ROLLUP_METRICS
+    )
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            bucket_ms INTEGER NOT NULL,
+            isp_id INTEGER NOT NULL REFERENCES isps(id),
+            count INTEGER NOT NULL,
+            {metric_columns},
+            PRIMARY KEY (bucket_ms, isp_id)
+        ) WITHOUT ROWID
+    ''')
+
 def init_db():
     try:
-        with sqlite3.connect(DB_PATH) as conn:
+        conn = get_connection()
+        _enable_incremental_vacuum(conn)
+        with conn:
+            for table in LOOKUP_TABLES.values():
+                conn.execute(f'CREATE TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)')
+            conn.execute(TESTS_SCHEMA.format(name='tests'))
+            _add_missing_columns(conn, 'tests', TESTS_EXTRA_COLUMNS)
+            # rows written before ts_ms existed; julianday(..., 'utc') reads the
+            # text as local time, like datetime.timestamp() does for new rows
             conn.execute('''
-                CREATE TABLE IF NOT EXISTS tests (
+                UPDATE tests
+                SET ts_ms = CAST(ROUND((julianday(timestamp, 'utc') - 2440587.5) * 86400000) AS INTEGER)
+                WHERE ts_ms IS NULL
+            ''')
+        _migrate_to_lookup_tables(conn)
+        with conn:
+            # the view holds no data, so recreating it picks up new columns
+            conn.execute('DROP VIEW IF EXISTS tests_view')
+            conn.execute(TESTS_VIEW)
+            conn.execute('DROP INDEX IF EXISTS idx_timestamp')
+            conn.execute(f'CREATE INDEX IF NOT EXISTS idx_tests_ts ON tests(ts_ms, id, {SUMMARY_COLUMNS})')
+            # rows by lookup id, for searches whose term only a few tests match
+            for column in SEARCH_COLUMNS:
+                conn.execute(f'CREATE INDEX IF NOT EXISTS idx_tests_{column} ON tests({column}_id)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS dns_results (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    download REAL, upload REAL, jitter REAL, ping REAL,
-                    packet_loss REAL, country TEXT, isp TEXT,
-                    ip_address TEXT, dns REAL, dns_server TEXT
+                    test_id INTEGER NOT NULL REFERENCES tests(id) ON DELETE CASCADE,
+                    resolver TEXT NOT NULL,
+                    is_system INTEGER NOT NULL DEFAULT 0,
+                    kind TEXT NOT NULL,
+                    queries INTEGER, failures INTEGER,
+                    p50 REAL, p95 REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_dns_results_test ON dns_results(test_id)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS samples (
+                    test_id INTEGER NOT NULL REFERENCES tests(id) ON DELETE CASCADE,
+                    series TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    times BLOB,
+                    vals BLOB NOT NULL,
+                    PRIMARY KEY (test_id, series)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS geo_cache (
+                    ip_address TEXT PRIMARY KEY,
+                    country TEXT, isp TEXT, provider TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS geo_provider_failures (
+                    url TEXT PRIMARY KEY,
+                    failed_until REAL NOT NULL
+                )
+            ''')
+            for table in ROLLUP_LEVELS.values():
+                _create_rollup_table(conn, table)
+            _drop_search_index(conn)
+            if conn.execute('PRAGMA user_version').fetchone()[0] < ROLLUPS_VERSION:
+                # a database from before the rollup tables gets them built once from
+                # its raw rows; one that already has rollups was kept current by
+                # every insert. Either way it is marked, so retention emptying a
+                # rollup tier later never triggers a rebuild over the kept tiers
+                has_rollups = any(conn.execute(f'SELECT EXISTS(SELECT 1 FROM {table})').fetchone()[0]
+                                  for table in ROLLUP_LEVELS.values())
+                if not has_rollups:
+                    rebuild_rollups(conn)
+                conn.execute(f'PRAGMA user_version = {ROLLUPS_VERSION}')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS server_health (
+                    url TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    success_rate REAL NOT NULL,
+                    latency REAL, throughput REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_checked TEXT NOT NULL
                 )
             ''')
-            conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON tests(timestamp)')
         print("[DB] Database initialized successfully.")
     except Exception as e:
         print(f"[DB] Error initializing database: {e}")
 
-def save_test_result(results: dict):
-    try:
-        with sqlite3.connect(DB_PATH) as conn:
-            conn.execute('''
-                INSERT INTO tests (
-                    timestamp, download, upload, jitter, ping,
-                    packet_loss, country, isp, ip_address, dns, dns_server
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                results['timestamp'],
-                round(results.get('download', 0), 3),
-                round(results.get('upload', 0), 3),
-                round(results.get('jitter', 0), 3),
-                round(results.get('ping', 0), 3),
-                round(results.get('packet_loss', 0), 3),
-                results.get('country', 'Unknown'),
-                results.get('isp', 'Unknown'),
-                results.get('ip_address', 'Unknown'),
-                round(results.get('dns', 0), 3) if results.get('dns', 0) > 0 else None,
-                results.get('dns_server', 'Unknown')
-            ))
-    except Exception as e:
-        print(f"[DB SAVE ERROR] {e}")
\ No newline at end of file
+def _insert_test(conn, results, rollup):
+    timestamp = results['timestamp']
+    ts_ms = epoch_ms(timestamp)
+    values = {m: round(results.get(m) or 0, 3) for m in ('download', 'upload', 'jitter', 'ping', 'packet_loss')}
+    values['dns'] = round(results['dns'], 3) if (results.get('dns') or 0) > 0 else None
+    isp = results.get('isp', 'Unknown')
+    cur = conn.execute('''
+        INSERT INTO tests (
+            timestamp, ts_ms, download, upload, jitter, ping,
+            packet_loss, country_id, isp_id, ip_address_id, dns, dns_server_id,
+            idle_latency, loaded_latency_down, loaded_latency_up,
+            bufferbloat, bufferbloat_grade
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        timestamp if isinstance(timestamp, str) else timestamp.isoformat(),
+        ts_ms,
+        values['download'],
+        values['upload'],
+        values['jitter'],
+        values['ping'],
+        values['packet_loss'],
+        _intern(conn, 'country', results.get('country', 'Unknown')),
+        _intern(conn, 'isp', isp),
+        _intern(conn, 'ip_address', results.get('ip_address', 'Unknown')),
+        values['dns'],
+        _intern(conn, 'dns_server', results.get('dns_server', 'Unknown')),
+        _round_or_none(results.get('idle_latency')),
+        _round_or_none(results.get('loaded_latency_down')),
+        _round_or_none(results.get('loaded_latency_up')),
+        _round_or_none(results.get('bufferbloat')),
+        results.get('bufferbloat_grade')
+    ))
+    test_id = cur.lastrowid
+    conn.executemany('''
+        INSERT INTO dns_results (test_id, resolver, is_system, kind, queries, failures, p50, p95)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(
+        test_id, row['resolver'], int(row.get('is_system', False)), row['kind'],
+        row.get('queries'), row.get('failures'),
+        _round_or_none(row.get('p50')), _round_or_none(row.get('p95'))
+    ) for row in results.get('dns_results', [])])
+    try:
+        conn.executemany(
+            'INSERT INTO samples (test_id, series, count, times, vals) VALUES (?, ?, ?, ?, ?)',
+            [(test_id, name, *pack_series(vals, times)) for name, times, vals in _collect_series(results)]
+        )
+    except (sqlite3.Error, ValueError, OverflowError) as e:
+        # the raw series are optional; losing them must not lose the result itself
+        print(f"[DB SAMPLES ERROR] {e}")
+    rollup.add(ts_ms, _intern(conn, 'isp', isp or 'Unknown'), values)
+    return test_id
+
+def save_test_results(batch):
+    # many results in one transaction: one WAL commit instead of one per row
+    try:
+        with get_connection() as conn:
+            rollup = RollupBatch()
+            ids = [_insert_test(conn, results, rollup) for results in batch]
+            rollup.flush(conn)
+            return ids
+    except Exception as e:
+        _forget_interned()
+        print(f"[DB SAVE ERROR] {e}")
+        return None
+
+def save_test_result(results: dict, defer=False):
+    # defer=True hands the row to the batch writer and returns at once (no id)
+    if defer:
+        _get_writer().put(results)
+        return None
+    try:
+        with get_connection() as conn:
+            rollup = RollupBatch()
+            test_id = _insert_test(conn, results, rollup)
+            rollup.flush(conn)
+            return test_id
+    except Exception as e:
+        _forget_interned()
+        print(f"[DB SAVE ERROR] {e}")
+        return None
+
+class _BatchWriter:
+    # background thread that drains queued results in batches of up to
+    # WRITE_BATCH_SIZE, waiting at most WRITE_FLUSH_INTERVAL for a batch to fill
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, results):
+        self.queue.put(results)
+
+    def _run(self):
+        # a None in the queue is a flush request: write what is pending right away
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + WRITE_FLUSH_INTERVAL
+            while batch[-1] is not None and len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            rows = [results for results in batch if results is not None]
+            if rows:
+                save_test_results(rows)
+            for _ in batch:
+                self.queue.task_done()
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def _get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _BatchWriter()
+            atexit.register(flush_writes)
+        return _writer
+
+def flush_writes():
+    # blocks until every deferred result is on disk
+    if _writer is not None:
+        _writer.queue.put(None)
+        _writer.queue.join()
+
+def _ewma(old, new):
+    if new is None:
+        return old
+    if old is None:
+        return new
+    return HEALTH_ALPHA * new + (1 - HEALTH_ALPHA) * old
+
+def get_server_health(kind):
+    try:
+        with get_connection() as conn:
+            rows = conn.execute('''
+                SELECT url, success_rate, latency, throughput, attempts, last_checked
+                FROM server_health WHERE kind = ?
+            ''', (kind,)).fetchall()
+        return {
+            row[0]: {
+                'success_rate': row[1], 'latency': row[2], 'throughput': row[3],
+                'attempts': row[4], 'last_checked': row[5]
+            } for row in rows
+        }
+    except Exception as e:
+        print(f"[DB HEALTH ERROR] {e}")
+        return {}
+
+def update_server_health(kind, url, success, latency=None, throughput=None):
+    try:
+        with get_connection() as conn:
+            row = conn.execute(
+                'SELECT success_rate, latency, throughput, attempts FROM server_health WHERE url = ?', (url,)
+            ).fetchone()
+            if row:
+                success_rate = _ewma(row[0], 1.0 if success else 0.0)
+                latency = _ewma(row[1], latency)
+                throughput = _ewma(row[2], throughput)
+                attempts = row[3] + 1
+            else:
+                success_rate = 1.0 if success else 0.0
+                attempts = 1
+            conn.execute('''
+                INSERT OR REPLACE INTO server_health
+                    (url, kind, success_rate, latency, throughput, attempts, last_checked)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (url, kind, success_rate, latency, throughput, attempts, datetime.now().isoformat()))
+    except Exception as e:
+        print(f"[DB HEALTH ERROR] {e}")
+
+def get_cached_location(ip_address, ttl):
+    try:
+        with get_connection() as conn:
+            row = conn.execute(
+                'SELECT country, isp, provider FROM geo_cache WHERE ip_address = ? AND fetched_at >= ?',
+                (ip_address, time.time() - ttl)
+            ).fetchone()
+        if row:
+            return {'country': row[0], 'isp': row[1], 'ip_address': ip_address, 'provider': row[2]}
+    except Exception as e:
+        print(f"[DB GEO ERROR] {e}")
+    return None
+
+def save_cached_location(location, provider):
+    try:
+        with get_connection() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO geo_cache (ip_address, country, isp, provider, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (location['ip_address'], location['country'], location['isp'], provider, time.time()))
+    except Exception as e:
+        print(f"[DB GEO ERROR] {e}")
+
+def get_failed_geo_providers():
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                'SELECT url FROM geo_provider_failures WHERE failed_until > ?', (time.time(),)
+            ).fetchall()
+        return {row[0] for row in rows}
+    except Exception as e:
+        print(f"[DB GEO ERROR] {e}")
+        return set()
+
+def mark_geo_provider_failed(url, ttl):
+    try:
+        with get_connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO geo_provider_failures (url, failed_until) VALUES (?, ?)',
+                (url, time.time() + ttl)
+            )
+    except Exception as e:
+        print(f"[DB GEO ERROR] {e}")
+
+def rollup_bucket(level, ts_ms):
+    # buckets start on local hours/days, like the timestamps users see
+    t = from_epoch_ms(ts_ms).replace(minute=0, second=0, microsecond=0)
+    if level == 'daily':
+        t = t.replace(hour=0)
+    return epoch_ms(t)
+
+def _hist_bin(value):
+    return min(HIST_BINS - 1, int(math.log1p(max(value, 0)) / math.log(HIST_RATIO)))
+
+def hist_percentile(hist, pct, lo=None, hi=None):
+    total = sum(hist)
+    if not total:
+        return None
+    rank = total * pct / 100
+    seen = 0
+    for i, n in enumerate(hist):
+        seen += n
+        if seen >= rank:
+            value = math.expm1((i + 0.5) * math.log(HIST_RATIO))  # geometric middle of the bin
+            if lo is not None:
+                value = max(value, lo)
+            if hi is not None:
+                value = min(value, hi)
+            return value
+    return hi
+
+def _empty_metric():
+    return {'n': 0, 'sum': 0.0, 'min': None, 'max': None, 'hist': [0] * HIST_BINS}
+
+# histograms are stored sparse: one uint32 per non-empty bin, bin number in the
+# top 8 bits and its count in the low 24; an hourly bucket is usually a few bytes
+def _pack_hist(hist):
+    return array('I', [(i << 24) | n for i, n in enumerate(hist) if n]).tobytes()
+
+def _unpack_hist_into(hist, blob):
+    packed = array('I')
+    packed.frombytes(blob)
+    for v in packed:
+        hist[v >> 24] += v & 0xFFFFFF
+
+def _merge_metric(acc, n, total, lo, hi, hist):
+    if not n:
+        return
+    acc['n'] += n
+    acc['sum'] += total
+    acc['min'] = lo if acc['min'] is None else min(acc['min'], lo)
+    acc['max'] = hi if acc['max'] is None else max(acc['max'], hi)
+    _unpack_hist_into(acc['hist'], hist)
+
+class RollupBatch:
+    # accumulates new rows per (level, bucket, isp_id) in memory; flush() merges
+    # them into the rollup tables with one read and one write per touched bucket
+    def __init__(self):
+        self.buckets = {}
+
+    def add(self, ts_ms, isp_id, values):
+        for level in ROLLUP_LEVELS:
+            key = (level, rollup_bucket(level, ts_ms), isp_id)
+            acc = self.buckets.get(key)
+            if acc is None:
+                acc = self.buckets[key] = {'count': 0, **{m: _empty_metric() for m in ROLLUP_METRICS}}
+            acc['count'] += 1
+            for m in ROLLUP_METRICS:
+                value = values.get(m)
+                if value is None:
+                    continue
+                st = acc[m]
+                st['n'] += 1
+                st['sum'] += value
+                st['min'] = value if st['min'] is None else min(st['min'], value)
+                st['max'] = value if st['max'] is None else max(st['max'], value)
+                st['hist'][_hist_bin(value)] += 1
+
+    def flush(self, conn):
+        columns = ['count'] + ROLLUP_FIELDS
+        for (level, bucket, isp_id), acc in self.buckets.items():
+            table = ROLLUP_LEVELS[level]
+            row = conn.execute(
+                f'SELECT {", ".join(columns)} FROM {table} WHERE bucket_ms = ? AND isp_id = ?', (bucket, isp_id)
+            ).fetchone()
+            if row:
+                acc['count'] += row[0]
+                for i, m in enumerate(ROLLUP_METRICS):
+                    _merge_metric(acc[m], *row[1 + 5 * i:6 + 5 * i])
+            params = [bucket, isp_id, acc['count']]
+            for m in ROLLUP_METRICS:
+                st = acc[m]
+                params += [st['n'], st['sum'], st['min'], st['max'], _pack_hist(st['hist'])]
+            conn.execute(
+                f'INSERT OR REPLACE INTO {table} (bucket_ms, isp_id, {", ".join(columns)}) '
+                f'VALUES ({", ".join("?" * len(params))})', params
+            )
+        self.buckets = {}
+
+def rebuild_rollups(conn):
+    # recomputes both levels from the raw rows; used once for databases that
+    # predate the rollup tables
+    for table in ROLLUP_LEVELS.values():
+        conn.execute(f'DELETE FROM {table}')
+    rollup = RollupBatch()
+    # rows without an ISP count under 'Unknown', as they do when saved
+    unknown = _intern(conn, 'isp', 'Unknown')
+    cur = conn.execute(f'''
+        SELECT t.ts_ms, CASE WHEN i.name IS NULL OR i.name = '' THEN ? ELSE t.isp_id END,
+               {", ".join(f"t.{m}" for m in ROLLUP_METRICS)}
+        FROM tests t LEFT JOIN isps i ON i.id = t.isp_id
+    ''', (unknown,))
+    while True:
+        rows = cur.fetchmany(5000)
+        if not rows:
+            break
+        for row in rows:
+            rollup.add(row[0], row[1], dict(zip(ROLLUP_METRICS, row[2:])))
+    rollup.flush(conn)
+
+def _combine_rollup_rows(rows):
+    # rows: (count, <n, sum, min, max, hist> per metric) from any number of ISPs/buckets
+    count = 0
+    metrics = {m: _empty_metric() for m in ROLLUP_METRICS}
+    for row in rows:
+        count += row[0]
+        for i, m in enumerate(ROLLUP_METRICS):
+            _merge_metric(metrics[m], *row[1 + 5 * i:6 + 5 * i])
+    stats = {'count': count}
+    for m, st in metrics.items():
+        stats[m] = {
+            'mean': st['sum'] / st['n'] if st['n'] else None,
+            'min': st['min'], 'max': st['max'],
+            'p95': hist_percentile(st['hist'], 95, st['min'], st['max']),
+        }
+    return stats
+
+def _first_point(conn, level, start_ms, end_ms):
+    # earliest row or bucket starting inside the range
+    if level == 'raw':
+        return conn.execute('SELECT MIN(ts_ms) FROM tests WHERE ts_ms BETWEEN ? AND ?',
+                            (start_ms, end_ms)).fetchone()[0]
+    return conn.execute(f'SELECT MIN(bucket_ms) FROM {ROLLUP_LEVELS[level]} WHERE bucket_ms BETWEEN ? AND ?',
+                        (start_ms, end_ms)).fetchone()[0]
+
+def _coverage(conn, start_ms, end_ms):
+    # {'raw': bool, 'hourly': bool}: whether that tier reaches back as far as the
+    # daily rollups do; once retention has pruned raw rows (or hourly buckets) a
+    # coarser tier is the only one with the start of the range. Only whole days
+    # inside the range count, so a test earlier on the first day does not make
+    # the raw rows look pruned
+    daily_first = _first_point(conn, 'daily', start_ms, end_ms)
+    covered = {}
+    for level in ('raw', 'hourly'):
+        first = _first_point(conn, level, start_ms, end_ms)
+        covered[level] = daily_first is None or (
+            first is not None and rollup_bucket('daily', first) <= daily_first)
+    return covered
+
+def choose_rollup_level(start_ms, end_ms, max_points):
+    # the finest source whose point count over the range still fits max_points
+    # and that covers the whole range
+    try:
+        with get_connection() as conn:
+            raw = conn.execute(
+                'SELECT COUNT(*) FROM (SELECT 1 FROM tests WHERE ts_ms BETWEEN ? AND ? LIMIT ?)',
+                (start_ms, end_ms, max_points + 1)
+            ).fetchone()[0]
+            covered = _coverage(conn, start_ms, end_ms)
+    except Exception as e:
+        print(f"[DB ROLLUP ERROR] {e}")
+        raw, covered = max_points + 1, {'raw': False, 'hourly': True}
+    if raw <= max_points and covered['raw']:
+        return 'raw'
+    if (end_ms - start_ms) / 3_600_000 <= max_points and covered['hourly']:
+        return 'hourly'
+    return 'daily'
+
+def get_rollup_series(level, start_ms, end_ms, isp=None):
+    # one combined point per bucket (all ISPs unless one is given), oldest first
+    table = ROLLUP_LEVELS[level]
+    query = f'SELECT bucket_ms, count, {", ".join(ROLLUP_FIELDS)} FROM {table} WHERE bucket_ms BETWEEN ? AND ?'
+    params = [rollup_bucket(level, start_ms), end_ms]
+    if isp is not None:
+        query += ' AND isp_id = (SELECT id FROM isps WHERE name = ?)'
+        params.append(isp)
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(query + ' ORDER BY bucket_ms', params).fetchall()
+    except Exception as e:
+        print(f"[DB ROLLUP ERROR] {e}")
+        return []
+    series, group = [], []
+    for row in rows:
+        if group and group[0][0] != row[0]:
+            series.append({'bucket_ms': group[0][0], **_combine_rollup_rows(r[1:] for r in group)})
+            group = []
+        group.append(row)
+    if group:
+        series.append({'bucket_ms': group[0][0], **_combine_rollup_rows(r[1:] for r in group)})
+    return series
+
+def get_rollup_stats(start_ms, end_ms, isp=None):
+    # count/mean/min/max/p95 per metric over the range, from hourly buckets for
+    # ranges up to a quarter that the hourly tier still covers and daily ones
+    # otherwise; edges are bucket-aligned
+    try:
+        with get_connection() as conn:
+            level = 'daily'
+            if end_ms - start_ms <= 92 * 86_400_000 and _coverage(conn, start_ms, end_ms)['hourly']:
+                level = 'hourly'
+            query = f'SELECT count, {", ".join(ROLLUP_FIELDS)} FROM {ROLLUP_LEVELS[level]} WHERE bucket_ms BETWEEN ? AND ?'
+            params = [rollup_bucket(level, start_ms), end_ms]
+            if isp is not None:
+                query += ' AND isp_id = (SELECT id FROM isps WHERE name = ?)'
+                params.append(isp)
+            return _combine_rollup_rows(conn.execute(query, params))
+    except Exception as e:
+        print(f"[DB ROLLUP ERROR] {e}")
+        return None
+
+def _drop_search_index(conn):
+    # the trigram FTS5 index earlier versions kept over tests_view; search now
+    # goes through the lookup tables, so it is only dead weight on every insert
+    for action in ('insert', 'delete', 'update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS tests_fts_{action}')
+    conn.execute('DROP TABLE IF EXISTS tests_fts')
+
+def search_clause(term):
+    # SQL predicate on tests_view plus its parameters; case-insensitive substring
+    # match over SEARCH_COLUMNS. The term is matched against the small lookup
+    # tables, then a capped count over the per-column id indexes picks the plan:
+    # a rare term fetches its few tests through those indexes and sorts them, a
+    # common one walks idx_tests_ts in order, where the next match is never far
+    pattern = '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+    params = [pattern] * len(SEARCH_COLUMNS)
+    match = ' OR '.join(
+        f"{{plus}}{c}_id IN (SELECT id FROM {LOOKUP_TABLES[c]} WHERE name LIKE ? ESCAPE '\\')" for c in SEARCH_COLUMNS
+    )
+    try:
+        matches = get_connection().execute(
+            f'SELECT COUNT(*) FROM (SELECT 1 FROM tests WHERE {match.format(plus="")} LIMIT ?)',
+            params + [SEARCH_SORT_MAX + 1]
+        ).fetchone()[0]
+    except Exception as e:
+        print(f"[DB SEARCH ERROR] {e}")
+        matches = SEARCH_SORT_MAX + 1
+    if matches <= SEARCH_SORT_MAX:
+        return f'id IN (SELECT id FROM tests WHERE {match.format(plus="")})', params
+    # unary + keeps the planner off the id indexes, so ORDER BY needs no sort
+    return f'({match.format(plus="+")})', params
+
+# raw per-phase series of a run; (results key, series name) for plain value lists
+SAMPLE_LISTS = [
+    ('jitter_samples', 'jitter'),
+    ('loaded_latency_down_samples', 'loaded_down'),
+    ('loaded_latency_up_samples', 'loaded_up'),
+]
+SAMPLE_TIMED = [('download_series', 'download'), ('upload_series', 'upload')]
+
+def _collect_series(results):
+    # (series, times or None, values) for everything a run measured, one entry
+    # per series name: the first one wins if a run somehow repeats a name
+    seen = set()
+    for name, times, values in _iter_series(results):
+        if name not in seen:
+            seen.add(name)
+            yield name, times, values
+
+def _iter_series(results):
+    for key, name in SAMPLE_TIMED:
+        points = results.get(key) or []
+        if points:
+            yield name, [t for t, _ in points], [v for _, v in points]
+    for key, name in SAMPLE_LISTS:
+        if results.get(key):
+            yield name, None, results[key]
+    for target, st in (results.get('ping_stats') or {}).items():
+        if st.get('rtts'):
+            yield f'ping:{target}', None, st['rtts']
+    for row in results.get('dns_results') or []:
+        if row.get('samples'):
+            yield f"dns:{row['resolver']}:{row['kind']}", None, row['samples']
+
+def _le(arr):
+    # blobs are little-endian whatever the host
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+def pack_series(values, times=None):
+    # values as float32; times (seconds from the phase start) as uint32 deltas in
+    # ms, or NULL when the samples are simply evenly spaced probes
+    vals = _le(array('f', values)).tobytes()
+    if times is None:
+        return len(values), None, vals
+    ms = [round(t * 1000) for t in times]
+    deltas = array('I', [b - a for a, b in zip([0] + ms, ms)])
+    return len(values), _le(deltas).tobytes(), vals
+
+def unpack_series(count, times, vals):
+    values = array('f')
+    values.frombytes(vals)
+    _le(values)
+    if times is None:
+        return None, values
+    deltas = array('I')
+    deltas.frombytes(times)
+    _le(deltas)
+    stamps, t = array('d'), 0
+    for d in deltas:
+        t += d
+        stamps.append(t / 1000)
+    return stamps, values
+
+def get_samples(test_id):
+    # {series: (times or None, values)} as arrays; numpy.frombuffer() takes
+    # either without copying
+    try:
+        with get_connection() as conn:
+            rows = conn.execute(
+                'SELECT series, count, times, vals FROM samples WHERE test_id = ? ORDER BY series', (test_id,)
+            ).fetchall()
+        return {row[0]: unpack_series(*row[1:]) for row in rows}
+    except Exception as e:
+        print(f"[DB SAMPLES ERROR] {e}")
+        return {}
@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import datetime
+from database import get_connection, epoch_ms, ROLLUP_LEVELS
+
+RETENTION_BATCH = 500      # rows deleted per transaction
+RETENTION_PAUSE = 0.05     # seconds between batches, so test writes and the UI get the lock
+VACUUM_PAGES = 256         # free pages handed back to the OS after each batch
+DAY_MS = 86_400_000
+
+_thread = None
+_lock = threading.Lock()
+
+def _incremental_vacuum(conn, pages):
+    # execute() steps a row-less pragma only once, which frees a single page;
+    # executescript() runs it to completion
+    conn.executescript(f'PRAGMA incremental_vacuum({pages});')
+
+def _delete_batches(sql, cutoff, stop_event):
+    # repeats a bounded DELETE until it removes nothing; each batch is its own
+    # short transaction followed by a partial incremental vacuum
+    deleted = 0
+    conn = get_connection()
+    while not (stop_event and stop_event.is_set()):
+        with conn:
+            n = conn.execute(sql, (cutoff, RETENTION_BATCH)).rowcount
+        _incremental_vacuum(conn, VACUUM_PAGES)
+        deleted += n
+        if n < RETENTION_BATCH:
+            break
+        time.sleep(RETENTION_PAUSE)
+    return deleted
+
+def apply_retention(raw_days, hourly_days=0, daily_days=0, stop_event=None):
+    # raw tests (with their DNS rows and samples) older than raw_days are dropped;
+    # the rollups built when they were saved keep their aggregates. Hourly and daily
+    # rollups have their own horizon. 0 keeps that tier forever.
+    now = epoch_ms(datetime.now())
+    counts = {}
+    try:
+        if raw_days:
+            # dns_results and samples go with ON DELETE CASCADE
+            counts['tests'] = _delete_batches('''
+                DELETE FROM tests WHERE id IN (
+                    SELECT id FROM tests WHERE ts_ms < ? ORDER BY ts_ms LIMIT ?
+                )
+            ''', now - raw_days * DAY_MS, stop_event)
+        for level, days in (('hourly', hourly_days), ('daily', daily_days)):
+            if days:
+                table = ROLLUP_LEVELS[level]
+                counts[table] = _delete_batches(f'''
+                    DELETE FROM {table} WHERE (bucket_ms, isp_id) IN (
+                        SELECT bucket_ms, isp_id FROM {table} WHERE bucket_ms < ? ORDER BY bucket_ms LIMIT ?
+                    )
+                ''', now - days * DAY_MS, stop_event)
+        # free pages left over (a batch can free more than VACUUM_PAGES), in steps too
+        conn = get_connection()
+        while conn.execute('PRAGMA freelist_count').fetchone()[0] and not (stop_event and stop_event.is_set()):
+            _incremental_vacuum(conn, VACUUM_PAGES)
+            time.sleep(RETENTION_PAUSE)
+    except Exception as e:
+        print(f"[DB RETENTION ERROR] {e}")
+    if any(counts.values()):
+        print(f"[DB RETENTION] removed {counts}")
+    return counts
+
+def start_retention(settings, stop_event=None):
+    # runs one retention pass on a background thread unless one is still going;
+    # retention is opt-in, so with every tier at 0 (the default) nothing runs
+    global _thread
+    days = [settings.get(f'retention_{tier}_days', 0) for tier in ('raw', 'hourly', 'daily')]
+    if not any(days):
+        return None
+    with _lock:
+        if _thread is not None and _thread.is_alive():
+            return _thread
+        _thread = threading.Thread(
+            target=apply_retention, name="db-retention", daemon=True,
+            args=(*days, stop_event)
+        )
+        _thread.start()
+        return _thread
@@ -0,0 +1,134 @@
+import json
+from datetime import datetime
+from config import DEFAULT_SETTINGS, SETTINGS_PATH
+from database import save_test_result
+from scheduler import Phase, run_phases
+from utils.network_tests import (
+    test_download, test_upload, test_jitter, test_ping, test_dns,
+    test_idle_latency, loaded_latency_prober, summarize_bufferbloat, DNS_RESOLVERS
+)
+from utils.geo_location import detect_location
+from utils import http_session
+
+# the measurement pipeline without any GUI dependency: the Qt Worker, the CLI and
+# the daemon all drive this class. Keep PyQt6, matplotlib and pandas out of here.
+
+CONNECTIVITY_URL = "https://www.google.com"
+
+class Callback:
+    # utils/* report through an object with .emit(str), like a pyqtSignal
+    def __init__(self, fn):
+        self.emit = fn
+
+def load_settings():
+    settings = DEFAULT_SETTINGS.copy()
+    if SETTINGS_PATH.exists():
+        try:
+            settings.update(json.loads(SETTINGS_PATH.read_text(encoding='utf-8')))
+        except Exception as e:
+            print(f"Settings load failed: {e}")
+    return settings
+
+class TestRunner:
+    def __init__(self, settings=None, on_output=print, on_progress=None, on_error=None, defer_save=False):
+        # defer_save hands the result to the database's batch writer instead of
+        # writing it before run() returns; the result then has no id
+        self.settings = settings or DEFAULT_SETTINGS
+        self.defer_save = defer_save
+        self.output = Callback(on_output)
+        self.on_progress = on_progress or (lambda value, message: on_output(f"[{value:3d}%] {message}"))
+        self.on_error = on_error or (lambda message: on_output(f"Error: {message}"))
+
+    def run(self):
+        try:
+            http_session.pop_timings()
+            http_session.get(CONNECTIVITY_URL, timeout=5)
+            self.output.emit("Network connection verified.\n")
+        except:
+            self.on_error("No internet connection.")
+            return None
+
+        results = {k: 0 for k in ['download', 'upload', 'jitter', 'ping', 'packet_loss', 'dns']}
+        results.update({'country': 'Unknown', 'isp': 'Unknown', 'ip_address': 'Unknown', 'dns_server': 'Unknown'})
+        results['timestamp'] = datetime.now().isoformat()
+
+        phases = self.build_phases()
+        if not phases:
+            self.on_error("No tests selected.")
+            return None
+
+        results.update(run_phases(phases, self.on_progress))
+        if self.settings.get('loaded_latency_enabled'):
+            results['bufferbloat'], results['bufferbloat_grade'] = summarize_bufferbloat(
+                self.output, results.get('idle_latency'),
+                results.get('loaded_latency_down'), results.get('loaded_latency_up')
+            )
+
+        results['http_timings'] = http_session.pop_timings()
+
+        results['id'] = save_test_result(results, defer=self.defer_save)
+        self.output.emit(f"Test completed at: {datetime.now().strftime('%H:%M:%S')}\n")
+        return results
+
+    def build_phases(self):
+        s = self.settings
+        out = self.output
+        phases = []
+
+        if s.get('jitter_enabled'):
+            def jitter():
+                value, stdev, latencies = test_jitter(out, s.get('jitter_samples', 200))
+                return {'jitter': value, 'jitter_stdev': stdev, 'jitter_samples': latencies}
+            # alone: DNS and geolocation traffic, or the ping sharing 1.1.1.1, would show up as jitter
+            phases.append(Phase("Jitter", "Computing jitter...", 25, jitter, exclusive=True))
+
+        if s.get('ping_enabled'):
+            def ping():
+                rtt, loss, stats = test_ping(out)
+                return {'ping': rtt, 'packet_loss': loss, 'ping_stats': stats}
+            phases.append(Phase("Ping", "Pinging...", 15, ping))
+
+        if s.get('dns_enabled'):
+            def dns():
+                dns_time, dns_server, dns_results = test_dns(out, s.get('dns_resolvers', DNS_RESOLVERS))
+                return {'dns': dns_time, 'dns_server': dns_server, 'dns_results': dns_results}
+            phases.append(Phase("DNS", "Testing DNS...", 5, dns))
+
+        if s.get('location_enabled'):
+            phases.append(Phase("Location", "Detecting location...", 5, lambda: detect_location(
+                out, s.get('geo_cache_minutes', 60) * 60
+            )))
+
+        # latency under load is probed in the background of the throughput phases
+        loaded = s.get('loaded_latency_enabled') and (s.get('download_enabled') or s.get('upload_enabled'))
+        if loaded:
+            # the baseline bufferbloat is graded against, so it runs on a quiet link too
+            phases.append(Phase("Idle latency", "Measuring idle latency...", 5, lambda: {
+                'idle_latency': test_idle_latency(out)
+            }, exclusive=True))
+
+        if s.get('download_enabled'):
+            def download():
+                prober = loaded_latency_prober() if loaded else None
+                speed, series = test_download(out, s.get('download_streams', 4), s.get('test_duration', 10), prober)
+                result = {'download': speed, 'download_series': series}
+                if prober and speed:
+                    result['loaded_latency_down'] = prober.stats()['p50']
+                    result['loaded_latency_down_samples'] = list(prober.rtts)
+                return result
+            phases.append(Phase("Download", "Testing download...", 25, download, exclusive=True))
+
+        if s.get('upload_enabled'):
+            def upload():
+                prober = loaded_latency_prober() if loaded else None
+                speed, series = test_upload(
+                    out, s.get('upload_streams', 4), s.get('upload_size_mb', 25), s.get('test_duration', 10), prober
+                )
+                result = {'upload': speed, 'upload_series': series}
+                if prober and speed:
+                    result['loaded_latency_up'] = prober.stats()['p50']
+                    result['loaded_latency_up_samples'] = list(prober.rtts)
+                return result
+            phases.append(Phase("Upload", "Testing upload...", 25, upload, exclusive=True))
+
+        return phases
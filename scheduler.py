@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+class Phase:
+    # exclusive phases run alone, one after another: the throughput tests because
+    # they saturate the link, the latency measurements because anything else on
+    # it would skew them. The rest only exchange a few packets and may overlap
+    def __init__(self, name, label, weight, run, exclusive=False):
+        self.name = name
+        self.label = label
+        self.weight = weight
+        self.run = run
+        self.exclusive = exclusive
+
+def run_phases(phases, progress):
+    # runs every phase and merges the dicts they return; progress(percent, message)
+    # is called as each phase starts and finishes, possibly from pool threads
+    total = sum(p.weight for p in phases) or 1
+    done = 0
+    results = {}
+
+    def finish(phase, result, error=None):
+        nonlocal done
+        done += phase.weight
+        if error is not None:
+            progress(int(done * 100 / total), f"{phase.name} failed: {str(error)[:80]}")
+        else:
+            results.update(result or {})
+            progress(int(done * 100 / total), f"{phase.name} finished.")
+
+    light = [p for p in phases if not p.exclusive]
+    heavy = [p for p in phases if p.exclusive]
+
+    if light:
+        with ThreadPoolExecutor(max_workers=len(light)) as pool:
+            futures = {}
+            for phase in light:
+                progress(int(done * 100 / total), phase.label)
+                futures[pool.submit(phase.run)] = phase
+            for future in as_completed(futures):
+                phase = futures[future]
+                try:
+                    finish(phase, future.result())
+                except Exception as e:
+                    finish(phase, None, e)
+
+    for phase in heavy:
+        progress(int(done * 100 / total), phase.label)
+        try:
+            finish(phase, phase.run())
+        except Exception as e:
+            finish(phase, None, e)
+
+    return results
@@ -1,20 +1,45 @@
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QPushButton, QLabel
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QComboBox
 from PyQt6.QtCore import Qt
-import sqlite3
-import matplotlib.pyplot as plt
 from datetime import datetime
 from PyQt6.QtGui import QPixmap
-from config import DB_PATH, GRAPH_TEMP_PATH, FLAG_EMOJIS
+from config import GRAPH_TEMP_PATH, FLAG_EMOJIS, GRAPH_MAX_POINTS
+from database import (
+    get_connection, epoch_ms, from_epoch_ms,
+    choose_rollup_level, get_rollup_series, get_rollup_stats
+)
+
+# (label, days back; None = everything)
+GRAPH_RANGES = [
+    ("Last 24 hours", 1),
+    ("Last 7 days", 7),
+    ("Last 30 days", 30),
+    ("Last 365 days", 365),
+    ("All time", None),
+]
+TICK_FORMATS = {'raw': '%m-%d %H:%M', 'hourly': '%m-%d %H:00', 'daily': '%Y-%m-%d'}
 
 def create_graph_tab(parent):
     graph_tab = QWidget()
     g_layout = QVBoxLayout(graph_tab)
     g_layout.setContentsMargins(25, 25, 25, 25)
 
+    controls = QHBoxLayout()
+    parent.graph_range_combo = QComboBox()
+    parent.graph_range_combo.addItems([label for label, _ in GRAPH_RANGES])
+    parent.graph_range_combo.setCurrentIndex(1)
     parent.graph_btn = QPushButton("Generate Speed & Performance Graph")
     parent.graph_btn.setCursor(Qt.CursorShape.PointingHandCursor)
     parent.graph_btn.clicked.connect(parent.generate_graph)
-    g_layout.addWidget(parent.graph_btn, alignment=Qt.AlignmentFlag.AlignCenter)
+    controls.addStretch()
+    controls.addWidget(parent.graph_range_combo)
+    controls.addWidget(parent.graph_btn)
+    controls.addStretch()
+    g_layout.addLayout(controls)
+
+    parent.graph_stats_label = QLabel("")
+    parent.graph_stats_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+    parent.graph_stats_label.setStyleSheet("color: #b0b0b0; font-size: 12px;")
+    g_layout.addWidget(parent.graph_stats_label)
 
     parent.graph_label = QLabel("Click 'Generate' to view the performance graph.")
     parent.graph_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -24,27 +49,64 @@ def create_graph_tab(parent):
     return graph_tab
 
 def generate_graph(parent):
+    # matplotlib is only needed once a graph is requested; Agg renders straight to
+    # the PNG without initialising a second Qt backend
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
     try:
-        with sqlite3.connect(DB_PATH) as conn:
-            cur = conn.cursor()
-            cur.execute('''
-                SELECT timestamp, download, upload, ping, jitter, packet_loss, dns, country, isp
-                FROM tests ORDER BY timestamp ASC
-            ''')
-            rows = cur.fetchall()
+        days = GRAPH_RANGES[parent.graph_range_combo.currentIndex()][1]
+        end_ms = epoch_ms(datetime.now())
+        with get_connection() as conn:
+            if days is None:
+                # rollups outlive raw rows once retention has pruned them
+                first = conn.execute('''
+                    SELECT MIN(m) FROM (SELECT MIN(ts_ms) AS m FROM tests
+                                        UNION ALL SELECT MIN(bucket_ms) FROM rollup_daily)
+                ''').fetchone()[0]
+                start_ms = first if first is not None else end_ms
+            else:
+                start_ms = end_ms - days * 86_400_000
+
+            # the finest source that still fits GRAPH_MAX_POINTS: raw rows for short
+            # ranges, hourly or daily rollups for long ones
+            level = choose_rollup_level(start_ms, end_ms, GRAPH_MAX_POINTS)
+            if level == 'raw':
+                rows = conn.execute('''
+                    SELECT ts_ms, download, upload, ping, jitter, packet_loss, dns, country, isp
+                    FROM tests_view WHERE ts_ms BETWEEN ? AND ? ORDER BY ts_ms ASC, id ASC
+                ''', (start_ms, end_ms)).fetchall()
+        if level != 'raw':
+            rows = [
+                (p['bucket_ms'], p['download']['mean'], p['upload']['mean'], p['ping']['mean'],
+                 p['jitter']['mean'], p['packet_loss']['mean'], p['dns']['mean'], None, None)
+                for p in get_rollup_series(level, start_ms, end_ms)
+            ]
 
         if not rows:
             parent.graph_label.setText("No data available for graph.")
+            parent.graph_stats_label.setText("")
             return
 
-        timestamps = [datetime.fromisoformat(row[0]).strftime('%H:%M') for row in rows]
+        stats = get_rollup_stats(start_ms, end_ms)
+        if stats and stats['count']:
+            parts = [f"{stats['count']} tests, mean / p95"]
+            for metric, label, unit in [('download', 'Down', 'Mbps'), ('upload', 'Up', 'Mbps'),
+                                        ('ping', 'Ping', 'ms'), ('jitter', 'Jitter', 'ms'), ('dns', 'DNS', 'ms')]:
+                st = stats[metric]
+                if st['mean'] is not None:
+                    parts.append(f"{label} {st['mean']:.1f} / {st['p95']:.1f} {unit}")
+            parent.graph_stats_label.setText(" | ".join(parts))
+
+        timestamps = [from_epoch_ms(row[0]).strftime(TICK_FORMATS[level]) for row in rows]
         downloads = [row[1] or 0 for row in rows]
         uploads = [row[2] or 0 for row in rows]
         pings = [row[3] or 0 for row in rows]
         jitters = [row[4] or 0 for row in rows]
         packet_losses = [row[5] or 0 for row in rows]
         dns_times = [row[6] or 0 for row in rows]
-        countries = [row[7] or "Unknown" for row in rows]
+        countries = [row[7] for row in rows]
 
         fig, ax1 = plt.subplots(figsize=(14, 8))
         fig.patch.set_facecolor('#1e1e1e')
@@ -69,14 +131,19 @@ def generate_graph(parent):
         ax1.legend(lines, [l.get_label() for l in lines], loc='upper left',
                    facecolor='#2d2d2d', edgecolor='#42a5f5', labelcolor='white')
 
-        plt.title('FluxFlow - Network Performance Over Time', color='white', fontsize=16, pad=20)
+        title = 'FluxFlow - Network Performance Over Time'
+        if level != 'raw':
+            title += f' ({level} averages)'
+        plt.title(title, color='white', fontsize=16, pad=20)
+        ax1.xaxis.set_major_locator(MaxNLocator(16))
         ax1.tick_params(colors='white')
         ax2.tick_params(colors='white')
         plt.xticks(rotation=45, color='white')
         plt.tight_layout()
 
-        for i, country in enumerate(countries):
-            flag = FLAG_EMOJIS.get(country, '🌍')
+        # rollup points span many tests and carry no single country
+        for i, country in enumerate(countries if level == 'raw' else []):
+            flag = FLAG_EMOJIS.get(country or "Unknown", '🌍')
             ax1.annotate(flag, (timestamps[i], downloads[i]),
                          xytext=(0, 10), textcoords='offset points',
                          fontsize=10, ha='center', color='yellow')
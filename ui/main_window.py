@@ -13,21 +13,28 @@ from PyQt6.QtCore import QDate, QTime
 from PyQt6.QtGui import QColor
 from PyQt6.QtWidgets import QGraphicsDropShadowEffect
 import json
-from datetime import datetime
-import sqlite3
-import pandas as pd
+from datetime import datetime, timedelta
+from pathlib import Path
 from PyQt6.QtWidgets import QFileDialog
 from config import (
     CHARCOAL_STYLESHEET, SETTINGS_PATH, DEFAULT_SETTINGS,
-    DB_PATH, PAGE_SIZE, FLAG_EMOJIS, BASE_DIR
+    PAGE_SIZE, FLAG_EMOJIS, BASE_DIR
 )
-from worker import Worker
-from utils.update_checker import check_for_updates
+from database import get_connection, save_test_results, epoch_ms, from_epoch_ms, search_clause
+from utils.dns_utils import parse_resolvers
 from .test_tab import create_test_tab
 from .summary_tab import create_summary_tab
 from .settings_tab import create_settings_tab
 from .graph_tab import create_graph_tab, generate_graph
 
+RETENTION_INTERVAL_MS = 6 * 3600 * 1000
+
+SUMMARY_SELECT = '''
+    SELECT id, ts_ms, download, upload, jitter, ping,
+           packet_loss, country, isp, ip_address, dns, dns_server
+    FROM tests_view
+'''
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -38,14 +45,25 @@ class MainWindow(QMainWindow):
         self.settings = DEFAULT_SETTINGS.copy()
         self.current_page = 0
         self.PAGE_SIZE = PAGE_SIZE
+        self.summary_filter = None      # (from_ms, to_ms, search) while a filter is applied
+        self.summary_anchor = None      # date of the last jump-to-date, None = newest first
+        self.summary_request = (None, False)
+        self.summary_keys = None        # (ts_ms, id) of the first and last row shown
 
         self.tabs = QTabWidget()
         self.setCentralWidget(self.tabs)
 
         self.setup_tabs()
         self.load_settings()
-        QTimer.singleShot(5000, lambda: check_for_updates(self, silent=True))
-        self.load_summary_page()
+        QTimer.singleShot(5000, lambda: self.check_for_updates(silent=True))
+        # the first summary page is queried once the event loop has painted the window
+        QTimer.singleShot(0, self.load_summary_page)
+        # retention runs on its own thread in small batches; once shortly after
+        # start-up, then every few hours for windows left open
+        QTimer.singleShot(15000, self.run_retention)
+        self.retention_timer = QTimer(self)
+        self.retention_timer.timeout.connect(self.run_retention)
+        self.retention_timer.start(RETENTION_INTERVAL_MS)
 
     def setup_tabs(self):
         self.tabs.addTab(create_test_tab(self), "Test")
@@ -64,6 +82,8 @@ class MainWindow(QMainWindow):
         self.start_btn.setEnabled(False)
         self.start_btn.setText("در حال تست...")
 
+        # worker pulls in requests, dnspython and the test engines; load them on first use
+        from worker import Worker
         self.worker = Worker(self.settings)
         self.worker.output_signal.connect(self.text_area.append)
         self.worker.error_signal.connect(self.on_test_error)
@@ -84,7 +104,9 @@ class MainWindow(QMainWindow):
         self.text_area.append("\n<span style='color:#81c784; font-weight:bold'>تست با موفقیت به پایان رسید!</span>\n")
         flag = FLAG_EMOJIS.get(results.get('country', 'Unknown'), '🌍')
         self.text_area.append(f"کشور: {results.get('country', 'Unknown')} {flag} | ISP: {results.get('isp', 'Unknown')}\n")
-        self.load_summary_page()  # بروزرسانی جدول
+        # re-runs the page being viewed (page 1 picks up the new row); a plain
+        # load_summary_page() would show the newest rows under the old page label
+        self.update_summary_page()  # بروزرسانی جدول
 
     def on_worker_finished(self):
         self.start_btn.setEnabled(True)
@@ -107,69 +129,133 @@ class MainWindow(QMainWindow):
         flag = FLAG_EMOJIS.get(results.get('country', 'Unknown'), '🌍')
         self.text_area.append(f"Country: {results.get('country', 'Unknown')} {flag}\n")
 
-    def load_summary_page(self):
-        self.summary_table.setRowCount(0)
-        offset = self.current_page * self.PAGE_SIZE
+    def _fetch_summary_rows(self, conn, cursor, newer, limit):
+        # keyset (seek) paging on (ts_ms, id): every page is an index seek from the
+        # last/first row shown, however deep into the history it is
+        clauses, params = [], []
+        if self.summary_filter:
+            from_ms, to_ms, search = self.summary_filter
+            clauses.append("ts_ms BETWEEN ? AND ?")
+            params.extend([from_ms, to_ms])
+            if search:
+                clause, search_params = search_clause(search)
+                clauses.append(clause)
+                params.extend(search_params)
+        if cursor:
+            clauses.append(f"(ts_ms, id) {'>' if newer else '<'} (?, ?)")
+            params.extend(cursor)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        order = "ASC" if newer else "DESC"
+        return conn.execute(
+            f"{SUMMARY_SELECT} {where} ORDER BY ts_ms {order}, id {order} LIMIT ?",
+            params + [limit]
+        ).fetchall()
+
+    def load_summary_page(self, cursor=None, newer=False):
         try:
-            with sqlite3.connect(DB_PATH) as conn:
-                cur = conn.cursor()
-                cur.execute('''
-                    SELECT id, timestamp, download, upload, jitter, ping,
-                           packet_loss, country, isp, ip_address, dns, dns_server
-                    FROM tests ORDER BY timestamp DESC LIMIT ? OFFSET ?
-                ''', (self.PAGE_SIZE + 1, offset))
-                rows = cur.fetchall()
-
-            for row in rows[:self.PAGE_SIZE]:
-                r = self.summary_table.rowCount()
-                self.summary_table.insertRow(r)
-
-                country = row[7] or "Unknown"
-                flag = FLAG_EMOJIS.get(country, '🌍')
-                isp_country = f"{row[8] or ''} / {country} {flag}".strip(" /")
-
-                dns_time = f"{row[10]:.1f} ms" if row[10] and row[10] > 0 else "—"
-
-                items = [
-                    str(row[0]),
-                    row[1][:19].replace('T', ' '),
-                    f"{row[2]:.3f}" if row[2] else "0.000",
-                    f"{row[3]:.3f}" if row[3] else "0.000",
-                    f"{row[4]:.3f}" if row[4] else "0.000",
-                    f"{row[5]:.1f}" if row[5] is not None else "0.0",
-                    f"{row[6]:.1f}",
-                    isp_country or "Unknown",
-                    row[9] or "",
-                    row[11] or "—",
-                    dns_time,
-                    ""
-                ]
-
-                for i, txt in enumerate(items):
-                    item = QTableWidgetItem(txt)
-                    if i in (2, 3, 4, 5, 6, 10):
-                        item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.summary_table.setItem(r, i, item)
-
-            has_next = len(rows) > self.PAGE_SIZE
-            self.next_page_btn.setEnabled(has_next)
-            self.prev_page_btn.setEnabled(self.current_page > 0)
-            self.page_label.setText(f"Page {self.current_page + 1}")
+            with get_connection() as conn:
+                rows = self._fetch_summary_rows(conn, cursor, newer, self.PAGE_SIZE + 1)
+                more = len(rows) > self.PAGE_SIZE
+                rows = rows[:self.PAGE_SIZE]
+                back_at_top = newer and not more
+                if newer:
+                    rows.reverse()
+
+                has_older, has_newer = (False, more) if newer else (more, False)
+                if rows and not newer:
+                    has_newer = cursor is not None and bool(
+                        self._fetch_summary_rows(conn, (rows[0][1], rows[0][0]), True, 1))
+                if rows and newer:
+                    has_older = bool(self._fetch_summary_rows(conn, (rows[-1][1], rows[-1][0]), False, 1))
+
+            if back_at_top:
+                # walked back to the newest rows: show a full first page instead
+                self.current_page = 0
+                self.summary_anchor = None
+                return self.load_summary_page()
+
+            self.summary_request = (cursor, newer)
+            self.summary_keys = ((rows[0][1], rows[0][0]), (rows[-1][1], rows[-1][0])) if rows else None
+            self._fill_summary_table(rows)
+
+            self.next_page_btn.setEnabled(has_older)
+            self.prev_page_btn.setEnabled(has_newer)
+            if self.summary_anchor is None:
+                self.page_label.setText(f"Page {self.current_page + 1}")
+            elif rows:
+                newest, oldest = from_epoch_ms(rows[0][1]), from_epoch_ms(rows[-1][1])
+                self.page_label.setText(f"{newest:%Y-%m-%d %H:%M} – {oldest:%Y-%m-%d %H:%M}")
+            else:
+                self.page_label.setText(f"Nothing on or before {self.summary_anchor}")
 
         except Exception as e:
             self.update_error(f"DB Error: {e}")
 
+    def _fill_summary_table(self, rows):
+        self.summary_table.setRowCount(0)
+        for row in rows:
+            r = self.summary_table.rowCount()
+            self.summary_table.insertRow(r)
+
+            country = row[7] or "Unknown"
+            flag = FLAG_EMOJIS.get(country, '🌍')
+            country_with_flag = f"{country} {flag}"
+
+            isp = row[8] or ""
+            isp_country = f"{isp} / {country_with_flag}".strip()
+            if not isp_country.replace('/', '').strip():
+                isp_country = "Unknown"
+
+            dns_time = f"{row[10]:.1f} ms" if row[10] and row[10] > 0 else "—"
+
+            items = [
+                str(row[0]),                                    # ID
+                from_epoch_ms(row[1]).strftime('%Y-%m-%d %H:%M:%S'),  # Time
+                f"{row[2]:.3f}" if row[2] is not None else "0.000",  # Down
+                f"{row[3]:.3f}" if row[3] is not None else "0.000",  # Up
+                f"{row[4]:.3f}" if row[4] is not None else "0.000",  # Jitter
+                f"{row[5]:.1f}" if row[5] is not None else "0.0",    # Ping
+                f"{row[6]:.1f}" if row[6] is not None else "0.0",    # Loss
+                isp_country,                                    # ISP / Country + Flag
+                row[9] or "",                                   # IP
+                row[11] or "—",                                 # DNS Server
+                dns_time,                                       # DNS Response
+                ""                                              # Actions
+            ]
+
+            for i, txt in enumerate(items):
+                item = QTableWidgetItem(txt)
+                if i in (2, 3, 4, 5, 6, 10):  # ستون‌های عددی: وسط‌چین
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
+                self.summary_table.setItem(r, i, item)
+
+            # راست‌چین کردن IP و DNS Server
+            for col in [8, 9]:
+                item = self.summary_table.item(r, col)
+                if item:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+
     def next_page(self):
-        self.current_page += 1
-        self.load_summary_page()
+        if self.summary_keys:
+            self.current_page += 1
+            self.load_summary_page(self.summary_keys[1])
 
     def prev_page(self):
-        if self.current_page > 0:
+        if self.summary_keys:
             self.current_page -= 1
-            self.load_summary_page()
+            self.load_summary_page(self.summary_keys[0], newer=True)
 
     def update_summary_page(self):
-        self.load_summary_page()
+        # re-runs the query the current page came from, so new rows show up on page 1
+        self.load_summary_page(*self.summary_request)
+
+    def jump_to_date(self):
+        day = self.jump_date.date().toPyDate()
+        self.summary_anchor = day
+        self.current_page = 0
+        # everything up to the end of that day: (ts_ms, id) < (next midnight, 0)
+        next_midnight = datetime.combine(day, datetime.min.time()) + timedelta(days=1)
+        self.load_summary_page((epoch_ms(next_midnight), 0))
 
     def clear_filter(self):
         self.date_from.setDate(QDate(2000, 1, 1))
@@ -177,13 +263,15 @@ class MainWindow(QMainWindow):
         self.time_from.setTime(QTime(0, 0))
         self.time_to.setTime(QTime(23, 59))
         self.search_edit.clear()
+        self.summary_filter = None
+        self.summary_anchor = None
         self.current_page = 0
         self.load_summary_page()
 
     def filter_summary(self):
-        self.current_page = 0
-        from_dt = datetime.combine(self.date_from.date().toPyDate(), self.time_from.time().toPyTime()).isoformat()
-        to_dt = datetime.combine(self.date_to.date().toPyDate(), self.time_to.time().toPyTime()).isoformat()
+        from_ms = epoch_ms(datetime.combine(self.date_from.date().toPyDate(), self.time_from.time().toPyTime()))
+        # the "to" minute is inclusive
+        to_ms = epoch_ms(datetime.combine(self.date_to.date().toPyDate(), self.time_to.time().toPyTime())) + 59_999
 
         raw_search = self.search_edit.text().strip()
         search = raw_search[:50]
@@ -191,91 +279,40 @@ class MainWindow(QMainWindow):
             self.update_error("Search term too long. Limited to 50 characters.")
             return
 
-        query = '''
-            SELECT id, timestamp, download, upload, jitter, ping,
-                   packet_loss, country, isp, ip_address, dns, dns_server
-            FROM tests WHERE timestamp BETWEEN ? AND ?
-        '''
-        params = [from_dt, to_dt]
-
-        if search:
-            query += " AND (country LIKE ? OR isp LIKE ?)"
-            params.extend([f"%{search}%", f"%{search}%"])
-
-        query += " ORDER BY timestamp DESC LIMIT ? OFFSET ?"
-        params.extend([self.PAGE_SIZE + 1, 0])
-
-        try:
-            with sqlite3.connect(DB_PATH) as conn:
-                cur = conn.cursor()
-                cur.execute(query, params)
-                rows = cur.fetchall()
-
-            # پاک کردن جدول
-            self.summary_table.setRowCount(0)
-
-            # پر کردن جدول — دقیقاً مثل load_summary_page
-            for row in rows[:self.PAGE_SIZE]:
-                r = self.summary_table.rowCount()
-                self.summary_table.insertRow(r)
-
-                country = row[7] or "Unknown"
-                flag = FLAG_EMOJIS.get(country, '🌍')
-                country_with_flag = f"{country} {flag}"
-
-                isp = row[8] or ""
-                isp_country = f"{isp} / {country_with_flag}".strip()
-                if not isp_country.replace('/', '').strip():
-                    isp_country = "Unknown"
-
-                dns_time = f"{row[10]:.1f} ms" if row[10] and row[10] > 0 else "—"
-
-                items = [
-                    str(row[0]),                                    # ID
-                    row[1][:19].replace('T', ' '),                  # Time
-                    f"{row[2]:.3f}" if row[2] is not None else "0.000",  # Down
-                    f"{row[3]:.3f}" if row[3] is not None else "0.000",  # Up
-                    f"{row[4]:.3f}" if row[4] is not None else "0.000",  # Jitter
-                    f"{row[5]:.1f}" if row[5] is not None else "0.0",    # Ping
-                    f"{row[6]:.1f}",                                    # Loss
-                    isp_country,                                    # ISP / Country + Flag
-                    row[9] or "",                                   # IP
-                    row[11] or "—",                                 # DNS Server
-                    dns_time,                                       # DNS Response
-                    ""                                              # Actions
-                ]
-
-                for i, txt in enumerate(items):
-                    item = QTableWidgetItem(txt)
-                    if i in (2, 3, 4, 5, 6, 10):  # ستون‌های عددی: وسط‌چین
-                        item.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-                    self.summary_table.setItem(r, i, item)
-
-                # راست‌چین کردن IP و DNS Server
-                for col in [8, 9]:
-                    item = self.summary_table.item(r, col)
-                    if item:
-                        item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
-
-            # صفحه‌بندی
-            has_next = len(rows) > self.PAGE_SIZE
-            self.next_page_btn.setEnabled(has_next)
-            self.prev_page_btn.setEnabled(False)  # چون صفحه اول هستیم
-            self.page_label.setText("Page 1")
-
-        except Exception as e:
-            self.update_error(f"Filter Error: {e}")
-            print(f"[Filter Debug] {e}")
+        # the filter stays in effect for Next/Previous and jump-to-date
+        self.summary_filter = (from_ms, to_ms, search)
+        self.summary_anchor = None
+        self.current_page = 0
+        self.load_summary_page()
 
     def apply_settings(self):
+        resolvers, rejected = parse_resolvers(self.dns_resolvers_edit.text())
+        if not resolvers:
+            resolvers = list(DEFAULT_SETTINGS['dns_resolvers'])
+        if rejected:
+            QMessageBox.warning(
+                self, "DNS Resolvers",
+                "Only IP addresses can be used as resolvers; ignored: " + ", ".join(rejected)
+            )
+        self.dns_resolvers_edit.setText(", ".join(resolvers))
         self.settings.update({
             'download_enabled': self.download_cb.isChecked(),
             'upload_enabled': self.upload_cb.isChecked(),
             'jitter_enabled': self.jitter_cb.isChecked(),
             'jitter_samples': self.jitter_samples_slider.value(),
+            'download_streams': self.download_streams_spin.value(),
+            'dns_resolvers': resolvers,
+            'upload_streams': self.upload_streams_spin.value(),
+            'upload_size_mb': self.upload_size_spin.value(),
+            'test_duration': self.test_duration_spin.value(),
             'ping_enabled': self.ping_cb.isChecked(),
             'dns_enabled': self.dns_cb.isChecked(),
-            'location_enabled': self.location_cb.isChecked()
+            'location_enabled': self.location_cb.isChecked(),
+            'geo_cache_minutes': self.geo_cache_spin.value(),
+            'retention_raw_days': self.retention_raw_spin.value(),
+            'retention_hourly_days': self.retention_hourly_spin.value(),
+            'retention_daily_days': self.retention_daily_spin.value(),
+            'loaded_latency_enabled': self.loaded_latency_cb.isChecked(),
         })
         self.save_settings()
         QMessageBox.information(self, "Success", "Settings applied and saved!")
@@ -298,8 +335,18 @@ class MainWindow(QMainWindow):
                 self.ping_cb.setChecked(self.settings.get('ping_enabled', True))
                 self.dns_cb.setChecked(self.settings.get('dns_enabled', True))
                 self.location_cb.setChecked(self.settings.get('location_enabled', True))
-                self.jitter_samples_slider.setValue(self.settings.get('jitter_samples', 10))
-                self.jitter_value_label.setText(str(self.settings.get('jitter_samples', 10)))
+                self.loaded_latency_cb.setChecked(self.settings.get('loaded_latency_enabled', True))
+                self.jitter_samples_slider.setValue(self.settings.get('jitter_samples', 200))
+                self.jitter_value_label.setText(str(self.settings.get('jitter_samples', 200)))
+                self.download_streams_spin.setValue(self.settings.get('download_streams', 4))
+                self.dns_resolvers_edit.setText(", ".join(self.settings.get('dns_resolvers', DEFAULT_SETTINGS['dns_resolvers'])))
+                self.upload_streams_spin.setValue(self.settings.get('upload_streams', 4))
+                self.upload_size_spin.setValue(self.settings.get('upload_size_mb', 25))
+                self.test_duration_spin.setValue(self.settings.get('test_duration', 10))
+                self.geo_cache_spin.setValue(self.settings.get('geo_cache_minutes', 60))
+                self.retention_raw_spin.setValue(self.settings.get('retention_raw_days', 0))
+                self.retention_hourly_spin.setValue(self.settings.get('retention_hourly_days', 0))
+                self.retention_daily_spin.setValue(self.settings.get('retention_daily_days', 0))
             except Exception as e:
                 QMessageBox.warning(self, "خطا", f"بارگذاری تنظیمات失敗: {e}")
 
@@ -307,6 +354,7 @@ class MainWindow(QMainWindow):
         generate_graph(self)
 
     def export_to_excel(self):
+        import pandas as pd
         try:
             default_path = BASE_DIR / "fluxflow_tests.xlsx"
             file_path, _ = QFileDialog.getSaveFileName(
@@ -330,18 +378,19 @@ class MainWindow(QMainWindow):
                 if reply == QMessageBox.StandardButton.No:
                     return
 
-            with sqlite3.connect(DB_PATH) as conn:
+            with get_connection() as conn:
                 df = pd.read_sql_query('''
                     SELECT id, timestamp, download, upload, jitter, ping,
                            packet_loss, country, isp, ip_address, dns, dns_server
-                    FROM tests ORDER BY timestamp DESC
+                    FROM tests_view ORDER BY ts_ms DESC, id DESC
                 ''', conn)
 
             if df.empty:
                 QMessageBox.warning(self, "No Data", "No test results to export.")
                 return
 
-            df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+            # stored as local ISO text already; trimming it is one vectorised pass
+            df['timestamp'] = df['timestamp'].str.slice(0, 19).str.replace('T', ' ', regex=False)
 
             df['country_with_flag'] = df['country'].apply(
                 lambda x: f"{x} {FLAG_EMOJIS.get(x, '🌍')}" if pd.notna(x) else "Unknown"
@@ -376,6 +425,7 @@ class MainWindow(QMainWindow):
             print(f"[Export Debug] {e}")
 
     def import_from_excel(self):
+        import pandas as pd
         try:
             file_path, _ = QFileDialog.getOpenFileName(self, "Open Excel File", "", "Excel Files (*.xlsx)")
             if not file_path:
@@ -404,19 +454,21 @@ class MainWindow(QMainWindow):
                     dns_str = str(row['DNS Response'])
                     dns = float(dns_str.replace(" ms", "").strip()) if "ms" in dns_str and dns_str.strip() != "—" else None
 
-                    records.append((
-                        row['Time'],
-                        float(row['Down (Mbps)']) if pd.notna(row['Down (Mbps)']) else 0,
-                        float(row['Up (Mbps)']) if pd.notna(row['Up (Mbps)']) else 0,
-                        float(row['Jitter (ms)']) if pd.notna(row['Jitter (ms)']) else 0,
-                        float(row['Ping (ms)']) if pd.notna(row['Ping (ms)']) else 0,
-                        float(row['Loss (%)']) if pd.notna(row['Loss (%)']) else 0,
-                        country,
-                        isp,
-                        str(row['IP Address']) if pd.notna(row['IP Address']) else "Unknown",
-                        dns,
-                        str(row['DNS Server']) if pd.notna(row['DNS Server']) else "Unknown"
-                    ))
+                    timestamp = str(row['Time'])
+                    epoch_ms(timestamp)  # unparsable times skip the row here, not fail the batch
+                    records.append({
+                        'timestamp': timestamp,
+                        'download': float(row['Down (Mbps)']) if pd.notna(row['Down (Mbps)']) else 0,
+                        'upload': float(row['Up (Mbps)']) if pd.notna(row['Up (Mbps)']) else 0,
+                        'jitter': float(row['Jitter (ms)']) if pd.notna(row['Jitter (ms)']) else 0,
+                        'ping': float(row['Ping (ms)']) if pd.notna(row['Ping (ms)']) else 0,
+                        'packet_loss': float(row['Loss (%)']) if pd.notna(row['Loss (%)']) else 0,
+                        'country': country,
+                        'isp': isp,
+                        'ip_address': str(row['IP Address']) if pd.notna(row['IP Address']) else "Unknown",
+                        'dns': dns,
+                        'dns_server': str(row['DNS Server']) if pd.notna(row['DNS Server']) else "Unknown"
+                    })
                 except Exception as row_error:
                     print(f"Skipped invalid row: {row_error}")
                     continue
@@ -425,12 +477,10 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Error", "No valid data found in the Excel file.")
                 return
 
-            with sqlite3.connect(DB_PATH) as conn:
-                conn.executemany('''
-                    INSERT INTO tests (timestamp, download, upload, jitter, ping,
-                        packet_loss, country, isp, ip_address, dns, dns_server)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', records)
+            # one transaction for the whole file
+            if save_test_results(records) is None:
+                QMessageBox.critical(self, "Import Error", "Import failed while writing to the database.")
+                return
 
             self.load_summary_page()
             self.update_summary_page()
@@ -440,5 +490,18 @@ class MainWindow(QMainWindow):
             QMessageBox.critical(self, "Import Error", f"Import failed:\n{e}")
             print(f"[Import Debug] {e}")
 
+    def run_retention(self):
+        from retention import start_retention
+        start_retention(self.settings)
+
     def check_for_updates(self, silent=False):
-        check_for_updates(self, silent)
\ No newline at end of file
+        from update_worker import UpdateWorker
+        from utils.update_checker import show_update_result, show_update_error
+
+        if getattr(self, 'update_worker', None) and self.update_worker.isRunning():
+            return
+        # a manual check skips the re-check interval; the ETag still keeps it cheap
+        self.update_worker = UpdateWorker(force=not silent)
+        self.update_worker.result_signal.connect(lambda info: show_update_result(self, info, silent))
+        self.update_worker.error_signal.connect(lambda error: show_update_error(self, error, silent))
+        self.update_worker.start()
\ No newline at end of file
@@ -1,6 +1,6 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QCheckBox, QHBoxLayout,
-    QPushButton, QSlider, QSpinBox
+    QPushButton, QSlider, QSpinBox, QLineEdit
 )
 from PyQt6.QtCore import Qt
 
@@ -22,9 +22,10 @@ def create_settings_tab(parent):
     parent.ping_cb = QCheckBox("Ping & Packet Loss | پینگ و از دست رفتن پکت")
     parent.dns_cb = QCheckBox("DNS Response Time | زمان پاسخ DNS")
     parent.location_cb = QCheckBox("Location & ISP Detection | تشخیص کشور و ISP")
+    parent.loaded_latency_cb = QCheckBox("Latency Under Load (Bufferbloat) | تاخیر زیر بار")
 
     for cb in [parent.download_cb, parent.upload_cb, parent.jitter_cb,
-               parent.ping_cb, parent.dns_cb, parent.location_cb]:
+               parent.ping_cb, parent.dns_cb, parent.location_cb, parent.loaded_latency_cb]:
         cb.setChecked(True)
         cb.setStyleSheet("font-size: 14px;")
         settings_layout.addWidget(cb)
@@ -33,9 +34,9 @@ def create_settings_tab(parent):
     jitter_layout = QHBoxLayout()
     jitter_label = QLabel("Jitter Samples | تعداد نمونه‌های جتر:")
     parent.jitter_samples_slider = QSlider(Qt.Orientation.Horizontal)
-    parent.jitter_samples_slider.setRange(5, 30)
-    parent.jitter_samples_slider.setValue(10)
-    parent.jitter_value_label = QLabel("10")
+    parent.jitter_samples_slider.setRange(10, 1000)
+    parent.jitter_samples_slider.setValue(200)
+    parent.jitter_value_label = QLabel("200")
     parent.jitter_samples_slider.valueChanged.connect(lambda v: parent.jitter_value_label.setText(str(v)))
 
     jitter_layout.addWidget(jitter_label)
@@ -43,6 +44,77 @@ def create_settings_tab(parent):
     jitter_layout.addWidget(parent.jitter_value_label)
     settings_layout.addLayout(jitter_layout)
 
+    # Download / Upload Streams
+    streams_layout = QHBoxLayout()
+    streams_label = QLabel("Download Streams | تعداد اتصال‌های همزمان دانلود:")
+    parent.download_streams_spin = QSpinBox()
+    parent.download_streams_spin.setRange(1, 16)
+    parent.download_streams_spin.setValue(4)
+
+    streams_layout.addWidget(streams_label)
+    streams_layout.addWidget(parent.download_streams_spin)
+
+    streams_layout.addWidget(QLabel("Upload Streams | اتصال‌های آپلود:"))
+    parent.upload_streams_spin = QSpinBox()
+    parent.upload_streams_spin.setRange(1, 16)
+    parent.upload_streams_spin.setValue(4)
+    streams_layout.addWidget(parent.upload_streams_spin)
+
+    streams_layout.addWidget(QLabel("Upload Size (MB) | حجم آپلود:"))
+    parent.upload_size_spin = QSpinBox()
+    parent.upload_size_spin.setRange(1, 500)
+    parent.upload_size_spin.setValue(25)
+    streams_layout.addWidget(parent.upload_size_spin)
+    streams_layout.addStretch()
+    settings_layout.addLayout(streams_layout)
+
+    # Test Duration (0 = fixed size)
+    duration_layout = QHBoxLayout()
+    duration_label = QLabel("Test Duration per Direction (s, 0 = fixed size) | مدت تست:")
+    parent.test_duration_spin = QSpinBox()
+    parent.test_duration_spin.setRange(0, 60)
+    parent.test_duration_spin.setValue(10)
+
+    duration_layout.addWidget(duration_label)
+    duration_layout.addWidget(parent.test_duration_spin)
+    duration_layout.addStretch()
+    settings_layout.addLayout(duration_layout)
+
+    # DNS Resolvers
+    resolvers_layout = QHBoxLayout()
+    resolvers_label = QLabel("DNS Resolvers | سرورهای DNS برای مقایسه:")
+    parent.dns_resolvers_edit = QLineEdit("1.1.1.1, 8.8.8.8, 9.9.9.9")
+    parent.dns_resolvers_edit.setPlaceholderText("Comma-separated resolver IPs")
+
+    resolvers_layout.addWidget(resolvers_label)
+    resolvers_layout.addWidget(parent.dns_resolvers_edit)
+    settings_layout.addLayout(resolvers_layout)
+
+    # Location cache (0 = always ask the providers)
+    geo_cache_layout = QHBoxLayout()
+    geo_cache_label = QLabel("Location Cache (min, 0 = off) | کش موقعیت:")
+    parent.geo_cache_spin = QSpinBox()
+    parent.geo_cache_spin.setRange(0, 1440)
+    parent.geo_cache_spin.setValue(60)
+
+    geo_cache_layout.addWidget(geo_cache_label)
+    geo_cache_layout.addWidget(parent.geo_cache_spin)
+    geo_cache_layout.addStretch()
+    settings_layout.addLayout(geo_cache_layout)
+
+    # Retention (days, 0 = keep forever): raw rows, then hourly, then daily aggregates
+    retention_layout = QHBoxLayout()
+    retention_label = QLabel("Keep Raw / Hourly / Daily (days, 0 = forever) | نگهداری داده:")
+    retention_layout.addWidget(retention_label)
+    for name, value in [('retention_raw_spin', 0), ('retention_hourly_spin', 0), ('retention_daily_spin', 0)]:
+        spin = QSpinBox()
+        spin.setRange(0, 36500)
+        spin.setValue(value)
+        setattr(parent, name, spin)
+        retention_layout.addWidget(spin)
+    retention_layout.addStretch()
+    settings_layout.addLayout(retention_layout)
+
     # دکمه اعمال تنظیمات
     apply_btn = QPushButton("Apply Settings | اعمال تنظیمات")
     apply_btn.clicked.connect(parent.apply_settings)
@@ -3,10 +3,6 @@ from PyQt6.QtWidgets import (
     QHeaderView, QPushButton, QDateEdit, QTimeEdit, QLineEdit, QFileDialog, QMessageBox
 )
 from PyQt6.QtCore import Qt, QDate, QTime
-import sqlite3
-import pandas as pd
-from datetime import datetime
-from config import DB_PATH, PAGE_SIZE, FLAG_EMOJIS, BASE_DIR
 
 def create_summary_tab(parent):
     summary_tab = QWidget()
@@ -30,7 +26,7 @@ def create_summary_tab(parent):
     parent.time_to.setTime(QTime(23, 59))
 
     parent.search_edit = QLineEdit()
-    parent.search_edit.setPlaceholderText("Search ISP/Country...")
+    parent.search_edit.setPlaceholderText("Search ISP/Country/IP/DNS...")
 
     filter_btn = QPushButton("Filter")
     filter_btn.clicked.connect(parent.filter_summary)
@@ -62,6 +58,16 @@ def create_summary_tab(parent):
     page_layout.addWidget(parent.prev_page_btn)
     page_layout.addWidget(parent.page_label)
     page_layout.addWidget(parent.next_page_btn)
+    page_layout.addSpacing(20)
+
+    # پرش به تاریخ
+    parent.jump_date = QDateEdit()
+    parent.jump_date.setDate(QDate.currentDate())
+    parent.jump_date.setCalendarPopup(True)
+    jump_btn = QPushButton("Go to Date")
+    jump_btn.clicked.connect(parent.jump_to_date)
+    page_layout.addWidget(parent.jump_date)
+    page_layout.addWidget(jump_btn)
     page_layout.addStretch()
     s_layout.addLayout(page_layout)
 
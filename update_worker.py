@@ -0,0 +1,18 @@
+from PyQt6.QtCore import QThread, pyqtSignal
+
+# kept apart from worker.py so the periodic update check imports only the
+# update checker and its HTTP session, not the test runner
+class UpdateWorker(QThread):
+    result_signal = pyqtSignal(dict)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, force=False):
+        super().__init__()
+        self.force = force
+
+    def run(self):
+        from utils.update_checker import fetch_latest_release
+        try:
+            self.result_signal.emit(fetch_latest_release(self.force))
+        except Exception as e:
+            self.error_signal.emit(str(e))
@@ -1,9 +1,24 @@
-from dns import resolver
+import ipaddress
 
 def get_system_dns():
     try:
+        from dns import resolver
         r = resolver.Resolver()
         nameservers = r.nameservers
         return nameservers[0] if nameservers else "Unknown"
     except Exception:
-        return "Unknown"
\ No newline at end of file
+        return "Unknown"
+
+def is_resolver_address(entry):
+    # dnspython only takes IP addresses as nameservers, not hostnames
+    try:
+        ipaddress.ip_address(entry)
+        return True
+    except ValueError:
+        return False
+
+def parse_resolvers(text):
+    # comma-separated resolver field -> (valid IPs, rejected entries), each once
+    # and in the order given
+    entries = list(dict.fromkeys(r.strip() for r in text.split(',') if r.strip()))
+    return [r for r in entries if is_resolver_address(r)], [r for r in entries if not is_resolver_address(r)]
@@ -1,50 +1,111 @@
-import requests
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import http_session
 from config import FLAG_EMOJIS
+from database import (
+    update_server_health, get_cached_location, save_cached_location,
+    get_failed_geo_providers, mark_geo_provider_failed
+)
+from .server_registry import order_servers
 
-def detect_location(output_signal):
+GEO_APIS = [
+    {"name": "ipapi.co", "url": "https://ipapi.co/json/"},
+    {"name": "FreeIPAPI", "url": "https://freeipapi.com/api/json"},
+    {"name": "IPWho", "url": "https://ipwho.is/"},
+]
+PUBLIC_IP_URL = "https://api.ipify.org?format=json"
+GEO_CACHE_TTL = 3600           # seconds a location stays valid for the same public IP
+GEO_NEGATIVE_TTL = 600         # seconds a failed (often rate-limited) provider is left alone
+GEO_TIMEOUT = 10
+
+def _parse_location(data):
     results = {'country': 'Unknown', 'isp': 'Unknown', 'ip_address': 'Unknown'}
-    geo_apis = [
-        {"name": "ipapi.co", "url": "https://ipapi.co/json/"},
-        {"name": "FreeIPAPI", "url": "https://freeipapi.com/api/json"},
-        {"name": "IPWho", "url": "https://ipwho.is/"},
-    ]
-
-    success = False
-    for api in geo_apis:
+    if 'org' in data and data['org']:
+        results['isp'] = data['org']
+    elif 'isp' in data and data['isp']:
+        results['isp'] = data['isp']
+    elif 'connection' in data and data['connection'].get('org'):
+        results['isp'] = data['connection']['org']
+
+    country = data.get('country_name') or data.get('country') or data.get('country_capital') or 'Unknown'
+    if country != 'Unknown':
+        results['country'] = country
+
+    ip = data.get('ip') or data.get('query') or data.get('ip_address') or 'Unknown'
+    if ip != 'Unknown':
+        results['ip_address'] = ip
+
+    if results['isp'] != 'Unknown' or results['country'] != 'Unknown':
+        return results
+    return None
+
+def _query_provider(api):
+    start = time.perf_counter()
+    response = http_session.get(api["url"], timeout=GEO_TIMEOUT)
+    response.raise_for_status()
+    location = _parse_location(response.json())
+    if location is None:
+        raise ValueError("no location in response")
+    return location, (time.perf_counter() - start) * 1000
+
+def _public_ip():
+    # one tiny request decides whether the cached location still applies
+    try:
+        return http_session.get(PUBLIC_IP_URL, timeout=3).json().get('ip')
+    except Exception:
+        return None
+
+def _report(output_signal, location, source):
+    flag = FLAG_EMOJIS.get(location['country'], '🌍')
+    output_signal.emit(
+        f"Location detected via {source}:\n"
+        f"Country: {location['country']} {flag}\n"
+        f"ISP: {location['isp']}\n"
+        f"Public IP: {location['ip_address']}\n"
+    )
+
+def detect_location(output_signal, ttl=GEO_CACHE_TTL):
+    results = {'country': 'Unknown', 'isp': 'Unknown', 'ip_address': 'Unknown'}
+
+    ip = _public_ip()
+    if ip and ttl > 0:
+        cached = get_cached_location(ip, ttl)
+        if cached:
+            _report(output_signal, cached, f"cache ({cached.pop('provider')})")
+            return cached
+
+    # every provider not on negative cache is asked at once; the first valid answer wins
+    failed = get_failed_geo_providers()
+    apis = [a for a in order_servers('geo', GEO_APIS, key=lambda a: a["url"]) if a["url"] not in failed]
+    if not apis:
+        output_signal.emit("All location services are cooling down after recent failures.\n")
+        return results
+
+    pool = ThreadPoolExecutor(max_workers=len(apis))
+    futures = {pool.submit(_query_provider, api): api for api in apis}
+    winner = None
+    for future in as_completed(futures):
+        api = futures[future]
         try:
-            response = requests.get(api["url"], timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            if 'org' in data and data['org']:
-                results['isp'] = data['org']
-            elif 'isp' in data and data['isp']:
-                results['isp'] = data['isp']
-            elif 'connection' in data and data['connection'].get('org'):
-                results['isp'] = data['connection']['org']
-
-            country = data.get('country_name') or data.get('country') or data.get('country_capital') or 'Unknown'
-            if country != 'Unknown':
-                results['country'] = country
-
-            ip = data.get('ip') or data.get('query') or data.get('ip_address') or 'Unknown'
-            if ip != 'Unknown':
-                results['ip_address'] = ip
-
-            if results['isp'] != 'Unknown' or results['country'] != 'Unknown':
-                flag = FLAG_EMOJIS.get(results['country'], '🌍')
-                output_signal.emit(
-                    f"Location detected via {api['name']}:\n"
-                    f"Country: {results['country']} {flag}\n"
-                    f"ISP: {results['isp']}\n"
-                    f"Public IP: {results['ip_address']}\n"
-                )
-                success = True
-                break
-        except Exception as e:
-            output_signal.emit(f"{api['name']} failed, trying next...\n")
-
-    if not success:
+            location, latency = future.result()
+        except Exception:
+            update_server_health('geo', api["url"], False)
+            mark_geo_provider_failed(api["url"], GEO_NEGATIVE_TTL)
+            output_signal.emit(f"{api['name']} failed.\n")
+            continue
+        update_server_health('geo', api["url"], True, latency)
+        winner = api
+        results = location
+        break
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    if winner is None:
         output_signal.emit("All location services failed.\n")
+        return results
 
-    return results
\ No newline at end of file
+    if results['ip_address'] == 'Unknown' and ip:
+        results['ip_address'] = ip
+    if results['ip_address'] != 'Unknown':
+        save_cached_location(results, winner['name'])
+    _report(output_signal, results, winner['name'])
+    return results
@@ -0,0 +1,207 @@
+import socket
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+POOL_CONNECTIONS = 16      # hosts kept in the pool manager
+POOL_MAXSIZE = 16          # keep-alive connections per host (one per parallel stream)
+DNS_CACHE_TTL = 60         # seconds a resolved address is reused for new connections
+SO_NWRITE = 0x1024         # macOS: bytes still in a socket's send buffer
+
+_local = threading.local()
+_dns_cache = {}
+_dns_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+_timings = deque(maxlen=200)
+
+class RequestTiming:
+    # per-request phase breakdown in ms; dns/connect/tls stay 0 when the request
+    # went out on a pooled keep-alive connection
+    def __init__(self, method, url):
+        self.method = method
+        self.url = url
+        self.dns = 0.0
+        self.connect = 0.0
+        self.tls = 0.0
+        self.ttfb = 0.0
+        self.transfer = 0.0
+        self.reused = True
+
+    @property
+    def setup(self):
+        return self.dns + self.connect + self.tls
+
+    def as_dict(self):
+        return {
+            'method': self.method, 'url': self.url, 'reused': self.reused,
+            'dns': round(self.dns, 3), 'connect': round(self.connect, 3), 'tls': round(self.tls, 3),
+            'ttfb': round(self.ttfb, 3), 'transfer': round(self.transfer, 3),
+        }
+
+    def __str__(self):
+        if self.reused:
+            return f"reused connection, TTFB {self.ttfb:.1f} ms, transfer {self.transfer:.1f} ms"
+        return (f"DNS {self.dns:.1f} ms, connect {self.connect:.1f} ms, TLS {self.tls:.1f} ms, "
+                f"TTFB {self.ttfb:.1f} ms, transfer {self.transfer:.1f} ms")
+
+def _resolve(host, port):
+    # every address of the host, in getaddrinfo's order, so a connection can fall
+    # back to the next one like urllib3's create_connection does
+    now = time.monotonic()
+    with _dns_lock:
+        cached = _dns_cache.get((host, port))
+        if cached and cached[1] > now:
+            return list(cached[0])
+    addrs = list(dict.fromkeys(info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    with _dns_lock:
+        _dns_cache[(host, port)] = (addrs, now + DNS_CACHE_TTL)
+    return list(addrs)
+
+def _prefer_address(host, port, addr):
+    # the address that connected goes first for the next connections to the host
+    with _dns_lock:
+        cached = _dns_cache.get((host, port))
+        if cached and cached[0][0] != addr and addr in cached[0]:
+            cached[0].remove(addr)
+            cached[0].insert(0, addr)
+
+class _TimedConnectionMixin:
+    # urllib3 only opens a socket in _new_conn, so everything timed here belongs to
+    # a fresh connection; the timing record of the calling thread is filled in
+    def request(self, *args, **kwargs):
+        # lets a streaming request body find the socket it is written to
+        _local.connection = self
+        try:
+            return super().request(*args, **kwargs)
+        finally:
+            _local.connection = None
+
+    def _new_conn(self):
+        timing = getattr(_local, 'timing', None)
+        start = time.perf_counter()
+        host = self._dns_host
+        try:
+            addrs = _resolve(host, self.port)
+        except OSError:
+            addrs = [host]  # let urllib3 resolve it and raise its own NameResolutionError
+        resolved = time.perf_counter()
+        try:
+            # one address at a time (an AAAA record without an IPv6 route fails
+            # here), the last error is raised if none of them connects
+            for i, addr in enumerate(addrs):
+                self._dns_host = addr
+                try:
+                    sock = super()._new_conn()
+                    break
+                except Exception:
+                    if i == len(addrs) - 1:
+                        raise
+            if addr != host:
+                _prefer_address(host, self.port, addr)
+        finally:
+            self._dns_host = host
+        if timing is not None:
+            timing.reused = False
+            timing.dns += (resolved - start) * 1000
+            timing.connect += (time.perf_counter() - resolved) * 1000
+        return sock
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    def connect(self):
+        timing = getattr(_local, 'timing', None)
+        before = timing.setup if timing is not None else 0
+        start = time.perf_counter()
+        super().connect()
+        if timing is not None:
+            # whatever connect() spent beyond DNS + TCP was the TLS handshake
+            timing.tls += max(0, (time.perf_counter() - start) * 1000 - (timing.setup - before))
+
+class _TimedHTTPPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPPool, 'https': _TimedHTTPSPool}
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = _TimedAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def request(method, url, stream=False, **kwargs):
+    # same contract as requests.request, on the shared keep-alive session; the
+    # response carries a .timing (RequestTiming). With stream=True the caller
+    # reads the body and may fill in timing.transfer itself.
+    timing = RequestTiming(method, url)
+    _local.timing = timing
+    start = time.perf_counter()
+    try:
+        response = get_session().request(method, url, stream=True, **kwargs)
+    finally:
+        _local.timing = None
+    headers_at = time.perf_counter()
+    timing.ttfb = max(0, (headers_at - start) * 1000 - timing.setup)
+    if not stream:
+        response.content
+        timing.transfer = (time.perf_counter() - headers_at) * 1000
+    response.timing = timing
+    _timings.append(timing)
+    return response
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+def post(url, data=None, **kwargs):
+    return request('POST', url, data=data, **kwargs)
+
+def head(url, **kwargs):
+    return request('HEAD', url, **kwargs)
+
+def current_socket():
+    # socket of the request the calling thread is sending, from inside a body's read()
+    conn = getattr(_local, 'connection', None)
+    return getattr(conn, 'sock', None)
+
+def unsent_bytes(sock):
+    # bytes written to a TCP socket that the peer hasn't acknowledged yet; where the
+    # OS doesn't say (Windows) the send buffer size, the most it can be holding.
+    # None if neither is known
+    try:
+        if sys.platform.startswith('linux'):
+            import fcntl
+            import termios
+            outq = array('i', [0])
+            fcntl.ioctl(sock.fileno(), termios.TIOCOUTQ, outq, True)
+            return outq[0]
+        if sys.platform == 'darwin':
+            return sock.getsockopt(socket.SOL_SOCKET, SO_NWRITE)
+        return sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def pop_timings():
+    # hands the timings recorded since the last call to the caller (e.g. one test run)
+    items = []
+    while _timings:
+        items.append(_timings.popleft().as_dict())
+    return items
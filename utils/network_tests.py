@@ -1,131 +1,583 @@
-import requests
 import time
 import random
 import statistics
-import platform
-import subprocess
-import re
-from dns import resolver
-from .dns_utils import get_system_dns
-
-def test_download(output_signal):
-    download_servers = [
-        ("Cloudflare", "https://speed.cloudflare.com/__down?bytes=25000000"),
-        ("OVH", "https://proof.ovh.net/files/10Mb.dat"),
-        ("TadServer", "https://speed.tadserver.com/100MB.test"),
-        ("ThinkBroadband", "http://ipv4.download.thinkbroadband.com/20MB.zip"),
-    ]
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from .dns_utils import get_system_dns, is_resolver_address
+from database import update_server_health
+from . import http_session
+from .server_select import rank_servers
+from .server_registry import order_servers, health_band
+from .ping_engine import probe, probe_targets, icmp_available, rfc3550_jitter, percentile, LatencyProber
 
+DOWNLOAD_SERVERS = [
+    ("Cloudflare", "https://speed.cloudflare.com/__down?bytes=25000000"),
+    ("OVH", "https://proof.ovh.net/files/10Mb.dat"),
+    ("TadServer", "https://speed.tadserver.com/100MB.test"),
+    ("ThinkBroadband", "http://ipv4.download.thinkbroadband.com/20MB.zip"),
+]
+
+STREAM_BYTE_LIMIT = 20_000_000
+
+SAMPLE_INTERVAL = 0.25     # seconds between throughput samples
+WARMUP_SECONDS = 2.0       # slow-start window thrown away after the first byte
+STABLE_WINDOW = 8          # samples the rolling estimate must stay flat for
+STABLE_TOLERANCE = 0.03    # max relative spread of the estimate inside that window
+FIRST_BYTE_TIMEOUT = 3.0   # give up on a server that hasn't sent/accepted a byte by then
+CONNECT_TIMEOUT = 3
+STOP_GRACE = 1.0
+RECV_BUFFER_SIZE = 256 * 1024
+READ_SIZE_MIN = 16 * 1024
+READ_SECONDS = 0.05        # a read should cover about this long, so slow links count smoothly
+CPU_BOUND_SHARE = 0.8      # above this share of one core the GIL-bound measurer may be the cap
+MIN_STEADY_SAMPLES = 4     # duration mode: samples after the warm-up a result needs
+MIN_FIXED_BYTES = 5_000_000  # fixed-size mode: bytes a result needs
+
+class _ByteCounter:
+    def __init__(self, streams):
+        self.lock = threading.Lock()
+        self.per_stream = [0] * streams
+        self.total = 0
+        self.first = None
+        self.last = None
+        self.timings = []
+        self.sources = []
+        self.finished = 0      # streams that have handed over everything they had to send
+        self.steady_samples = 0
+        self.cpu_seconds = 0
+        self.wall_seconds = 0
+
+    def add(self, stream, n):
+        # first/last track the window in which bytes actually moved
+        now = time.monotonic()
+        with self.lock:
+            if self.first is None:
+                self.first = now
+            if n:
+                self.per_stream[stream] += n
+                self.total += n
+                self.last = now
+
+    def stream_finished(self):
+        with self.lock:
+            self.finished += 1
+
+    def poll(self):
+        # sources that can only tell how far they got when asked (upload bodies)
+        for source in list(self.sources):
+            source.update()
+
+    def active_time(self):
+        if self.first is None or self.last is None:
+            return 0
+        return self.last - self.first
+
+def _sample_throughput(counter, futures, stop_event, duration):
+    # polls the shared counter every SAMPLE_INTERVAL, drops the warm-up window and,
+    # when duration is set, stops at the deadline or once the estimate is stable
+    series = []
+    estimates = []
+    start = last_t = time.monotonic()
+    last_total = 0
+    warm_t = warm_total = None
+    full_t = full_total = None
+
+    while not all(f.done() for f in futures):
+        time.sleep(SAMPLE_INTERVAL)
+        counter.poll()
+        now = time.monotonic()
+        total = counter.total
+        series.append((round(now - start, 3), (total - last_total) * 8 / ((now - last_t) * 1_000_000)))
+        last_t, last_total = now, total
+
+        if counter.first is None:
+            if now - start >= FIRST_BYTE_TIMEOUT:
+                break
+            continue
+        if warm_t is None and now - counter.first >= WARMUP_SECONDS:
+            warm_t, warm_total = now, total
+            continue
+        if not duration:
+            # fixed size: the estimate ends with the last sample in which every stream
+            # was still sending; the tail where they finish one by one is dropped
+            # like the warm-up
+            if not counter.finished and not any(f.done() for f in futures):
+                full_t, full_total = now, total
+            continue
+        if now - start >= duration:
+            break
+        if warm_t is not None:
+            estimates.append((total - warm_total) * 8 / ((now - warm_t) * 1_000_000))
+            window = estimates[-STABLE_WINDOW:]
+            if len(window) == STABLE_WINDOW and min(window) > 0 and \
+                    (max(window) - min(window)) / max(window) < STABLE_TOLERANCE:
+                break
+    stop_event.set()
+
+    if warm_t is not None:
+        counter.steady_samples = sum(1 for t, _ in series if start + t > warm_t)
+    if full_t is not None:
+        end_t, end_total = full_t, full_total
+    elif duration:
+        # timed: the window runs to the last sample, idle stretches included
+        end_t, end_total = last_t, last_total
+    else:
+        # a stream failed early: the window ends with the last byte that moved
+        with counter.lock:
+            end_t, end_total = counter.last, counter.total
+    if warm_t is not None and end_t is not None and end_t > warm_t and end_total > warm_total:
+        steady = (end_total - warm_total) * 8 / ((end_t - warm_t) * 1_000_000)
+    elif counter.active_time() > 0:
+        steady = counter.total * 8 / (counter.active_time() * 1_000_000)
+    else:
+        steady = 0
+    return steady, [(t, round(v, 3)) for t, v in series]
+
+def _run_streams(target, args, streams, duration, prober=None):
+    counter = _ByteCounter(streams)
+    stop_event = threading.Event()
+    errors = []
+    pool = ThreadPoolExecutor(max_workers=streams)
+    futures = [pool.submit(target, *args, i, counter, stop_event, errors) for i in range(streams)]
+    if prober:
+        prober.start()
+    cpu_start, wall_start = time.process_time(), time.monotonic()
+    speed, series = _sample_throughput(counter, futures, stop_event, duration)
+    counter.cpu_seconds = time.process_time() - cpu_start
+    counter.wall_seconds = time.monotonic() - wall_start
+    if prober:
+        prober.stop()
+    # streams notice stop_event within one chunk; those still stuck connecting
+    # after STOP_GRACE are left behind rather than waited for
+    wait(futures, timeout=STOP_GRACE)
+    pool.shutdown(wait=False, cancel_futures=True)
+    return speed, series, counter, errors
+
+def _select_servers(kind, servers):
+    # known-dead endpoints are filtered by the health registry, the rest are raced;
+    # the reachable ones are tried by stored health first and RTT within a band,
+    # and those that lose the race by not answering at all are recorded as failures
+    candidates = order_servers(kind, servers)
+    ranked = rank_servers(candidates, band=health_band(kind))
+    if ranked[0][2] is not None:
+        alive = {url for _, url, _ in ranked}
+        for _, url in candidates:
+            if url not in alive:
+                update_server_health(kind, url, False)
+    return ranked
+
+def _report_streams(output_signal, counter):
+    duration = counter.active_time()
+    if duration <= 0:
+        return
+    for i, n in enumerate(counter.per_stream):
+        output_signal.emit(f"  Stream {i + 1}: {(n * 8) / (duration * 1_000_000):.2f} Mbps\n")
+    if counter.cpu_seconds > 0 and counter.wall_seconds > 0:
+        share = counter.cpu_seconds / counter.wall_seconds
+        output_signal.emit(
+            f"  CPU cost: {counter.total / counter.cpu_seconds / (1024 * 1024):.1f} MB per CPU-second "
+            f"({share * 100:.0f}% of one core)\n"
+        )
+        if share >= CPU_BOUND_SHARE:
+            output_signal.emit("  Warning: the measuring host is close to CPU-bound; the result may be capped by it.\n")
+
+def _raw_reader(r):
+    # http.client's readinto() fills our buffer straight from the socket; only
+    # usable when urllib3 has nothing to decode
+    fp = getattr(r.raw, '_fp', None)
+    if fp is None or not hasattr(fp, 'readinto') or r.headers.get('Content-Encoding', 'identity') != 'identity':
+        return None
+    return fp.readinto
+
+def _download_stream(url, duration, index, counter, stop_event, errors):
+    # every stream opens its own connection so several TCP flows share the link;
+    # without a duration it reads one STREAM_BYTE_LIMIT worth of data, with one
+    # it keeps re-fetching until the sampler sets stop_event
+    received = 0
+    view = memoryview(bytearray(RECV_BUFFER_SIZE))
+    # readinto() blocks until the buffer is full, so the read size adapts: large on
+    # fast links to keep the per-read cost down, small on slow ones so bytes reach
+    # the counter in steps of about READ_SECONDS instead of 256 KB at a time
+    views = {}
+    size = READ_SIZE_MIN
+
+    def read_adaptive():
+        nonlocal size
+        started = time.perf_counter()
+        n = readinto(views.get(size) or views.setdefault(size, view[:size]))
+        elapsed = time.perf_counter() - started
+        if elapsed > READ_SECONDS and size > READ_SIZE_MIN:
+            size //= 2
+        elif elapsed < READ_SECONDS / 4 and size < RECV_BUFFER_SIZE:
+            size *= 2
+        return n
+
+    headers = {'Accept-Encoding': 'identity'}
+    try:
+        while not stop_event.is_set():
+            with http_session.get(url, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, 45)) as r:
+                r.raise_for_status()
+                started = time.perf_counter()
+                readinto = _raw_reader(r)
+                # the preallocated buffer is overwritten on every read: bytes are
+                # counted and dropped without a new object per chunk
+                chunks = iter(read_adaptive, 0) if readinto else \
+                    (len(c) for c in r.iter_content(chunk_size=RECV_BUFFER_SIZE))
+                for n in chunks:
+                    counter.add(index, n)
+                    received += n
+                    if stop_event.is_set() or (not duration and received >= STREAM_BYTE_LIMIT):
+                        break
+                r.timing.transfer = (time.perf_counter() - started) * 1000
+                counter.timings.append(r.timing)
+            if not duration:
+                return
+    except Exception as e:
+        errors.append(e)
+
+def test_download(output_signal, streams=4, duration=10, prober=None):
+    streams = max(1, int(streams))
     speed = 0
-    for name, url in download_servers:
-        try:
-            start = time.time()
-            r = requests.get(url, stream=True, timeout=45)
-            r.raise_for_status()
-            downloaded = 0
-            for chunk in r.iter_content(chunk_size=1024*1024):
-                downloaded += len(chunk)
-                if downloaded >= 20_000_000:
-                    break
-            duration = time.time() - start
-            if duration > 0 and downloaded > 5_000_000:
-                speed = (downloaded * 8) / (duration * 1_000_000)
-                size_mb = downloaded / (1024 * 1024)
-                output_signal.emit(f"Download: {speed:.2f} Mbps ({size_mb:.1f} MB) via {name}\n")
-                return speed
-        except Exception as e:
-            output_signal.emit(f"{name} failed: {str(e)[:50]}... trying next\n")
-    if speed == 0:
-        output_signal.emit("All download servers failed.\n")
-    return speed
-
-def test_upload(output_signal):
-    volume_mb = 2
-    data = bytes(random.randbytes(volume_mb * 1024 * 1024))
-    upload_servers = [
-        "https://httpbin.org/post",
-        "https://postman-echo.com/post",
-        "https://bin.org/post",
-    ]
+    for name, url, rtt in _select_servers('download', DOWNLOAD_SERVERS):
+        if rtt is not None:
+            output_signal.emit(f"Trying {name} (RTT {rtt:.0f} ms)\n")
+        speed, series, counter, errors = _run_streams(_download_stream, (url, duration), streams, duration, prober)
+
+        # a slow link moves few bytes in a timed run, so there the samples past the
+        # warm-up decide whether the estimate is usable
+        enough = counter.steady_samples >= MIN_STEADY_SAMPLES if duration else counter.total > MIN_FIXED_BYTES
+        if speed > 0 and enough:
+            size_mb = counter.total / (1024 * 1024)
+            output_signal.emit(
+                f"Download: {speed:.2f} Mbps ({size_mb:.1f} MB in {counter.active_time():.1f}s, "
+                f"{streams} streams, {len(series)} samples) via {name}\n"
+            )
+            _report_streams(output_signal, counter)
+            if counter.timings:
+                output_signal.emit(f"  Stream 1 request: {counter.timings[0]}\n")
+            update_server_health('download', url, True, rtt, speed)
+            return speed, series
+        speed = 0
+        update_server_health('download', url, False, rtt)
+        reason = str(errors[0])[:50] if errors else "not enough data"
+        output_signal.emit(f"{name} failed: {reason}... trying next\n")
+    output_signal.emit("All download servers failed.\n")
+    return speed, []
+
+UPLOAD_SERVERS = [
+    ("httpbin", "https://httpbin.org/post"),
+    ("Postman Echo", "https://postman-echo.com/post"),
+    ("bin.org", "https://bin.org/post"),
+]
+
+UPLOAD_BLOCK_SIZE = 256 * 1024
+_upload_block = None
+
+def _get_upload_block():
+    # one random block is generated once and every upload body slices into it
+    global _upload_block
+    if _upload_block is None:
+        _upload_block = memoryview(random.randbytes(UPLOAD_BLOCK_SIZE))
+    return _upload_block
+
+class _UploadStopped(Exception):
+    pass
+
+class _StreamingBody:
+    # file-like body of a fixed length; requests streams it with a Content-Length
+    # header and each read() means the block handed out before it was written.
+    # Written isn't sent: the kernel send buffer swallows megabytes at once, so the
+    # counter is only credited with what the peer has acknowledged (written minus
+    # the socket's unacknowledged bytes), polled by the sampler; where the OS can't
+    # report that, the whole body is credited when the response arrives
+    def __init__(self, size, index, counter, stop_event):
+        self.size = size
+        self.remaining = size
+        self.index = index
+        self.counter = counter
+        self.stop_event = stop_event
+        self.pending = 0
+        self.written = 0
+        self.credited = 0
+        self.sent_all = False
+        self.sock = None
+        self.lock = threading.Lock()
+        self.block = _get_upload_block()
+
+    def __len__(self):
+        return self.size
+
+    def update(self, done=False):
+        with self.lock:
+            if done:
+                acked = self.written
+            else:
+                unsent = http_session.unsent_bytes(self.sock) if self.sock is not None else None
+                if unsent is None:
+                    return
+                acked = self.written - unsent
+            if acked > self.credited:
+                self.counter.add(self.index, acked - self.credited)
+                self.credited = acked
+
+    def read(self, amt=-1):
+        if self.sock is None:
+            self.sock = http_session.current_socket()
+            self.counter.sources.append(self)
+            self.counter.add(self.index, 0)  # marks the start of the transfer
+        self.written += self.pending
+        self.pending = 0
+        if self.stop_event.is_set():
+            # aborts the request mid-body; what the peer acknowledged is counted
+            self.update()
+            raise _UploadStopped()
+        if self.remaining <= 0:
+            if not self.sent_all:
+                self.sent_all = True
+                self.counter.stream_finished()
+            return b""
+        n = min(self.remaining, UPLOAD_BLOCK_SIZE if amt is None or amt < 0 else amt, UPLOAD_BLOCK_SIZE)
+        self.remaining -= n
+        self.pending = n
+        return self.block[:n]
+
+    def finish(self):
+        # the response is in, so the server has the whole body
+        self.update(done=True)
+        if self in self.counter.sources:
+            self.counter.sources.remove(self)
+
+def _upload_stream(url, size, duration, index, counter, stop_event, errors):
+    try:
+        while not stop_event.is_set():
+            body = _StreamingBody(size, index, counter, stop_event)
+            r = http_session.post(url, data=body, timeout=(CONNECT_TIMEOUT, 60))
+            if r.status_code not in (200, 201):
+                errors.append(f"HTTP {r.status_code}")
+                return
+            body.finish()
+            if not duration:
+                return
+    except _UploadStopped:
+        pass
+    except Exception as e:
+        errors.append(e)
+
+def test_upload(output_signal, streams=4, volume_mb=25, duration=10, prober=None):
+    streams = max(1, int(streams))
+    per_stream = max(1, int(volume_mb * 1024 * 1024) // streams)
 
     speed = 0
-    for url in upload_servers:
-        try:
-            start = time.time()
-            r = requests.post(url, data=data, timeout=60)
-            if r.status_code in (200, 201):
-                duration = time.time() - start
-                if duration > 0:
-                    speed = (len(data) * 8) / (duration * 1_000_000)
-                    output_signal.emit(f"Upload: {speed:.2f} Mbps ({volume_mb} MB)\n")
-                    return speed
-        except:
-            pass
-    if speed == 0:
-        output_signal.emit("All upload servers failed.\n")
-    return speed
+    for name, url, rtt in _select_servers('upload', UPLOAD_SERVERS):
+        if rtt is not None:
+            output_signal.emit(f"Trying {name} (RTT {rtt:.0f} ms)\n")
+        speed, series, counter, errors = _run_streams(_upload_stream, (url, per_stream, duration), streams, duration, prober)
 
-def test_jitter(output_signal, samples=10):
+        if speed > 0 and len(errors) < streams:
+            size_mb = counter.total / (1024 * 1024)
+            output_signal.emit(
+                f"Upload: {speed:.2f} Mbps ({size_mb:.1f} MB in {counter.active_time():.1f}s, "
+                f"{streams} streams, {len(series)} samples) via {name}\n"
+            )
+            _report_streams(output_signal, counter)
+            update_server_health('upload', url, True, rtt, speed)
+            return speed, series
+        speed = 0
+        update_server_health('upload', url, False, rtt)
+        reason = str(errors[0])[:50] if errors else "no data accepted"
+        output_signal.emit(f"{name} failed: {reason}... trying next\n")
+    output_signal.emit("All upload servers failed.\n")
+    return speed, []
+
+JITTER_TARGET = "1.1.1.1"
+JITTER_URL = "https://api.ipify.org"
+JITTER_INTERVAL = 0.005    # ICMP probes are pipelined, so up to 200 samples per second
+JITTER_MAX_SECONDS = 5
+
+def _keepalive_latencies(samples):
+    # one warm-up request pays DNS + TCP + TLS (unless the pool already holds a
+    # connection), every sample after it reuses the connection
     latencies = []
+    http_session.get(JITTER_URL, timeout=10).raise_for_status()
+    deadline = time.perf_counter() + JITTER_MAX_SECONDS
     for _ in range(samples):
+        if time.perf_counter() >= deadline:
+            break
         try:
-            start = time.time()
-            requests.get("https://api.ipify.org", timeout=20).raise_for_status()
-            latencies.append((time.time() - start) * 1000)
-        except:
+            start = time.perf_counter_ns()
+            http_session.get(JITTER_URL, timeout=5).raise_for_status()
+            latencies.append((time.perf_counter_ns() - start) / 1_000_000)
+        except Exception:
             pass
+    return latencies
+
+def test_jitter(output_signal, samples=200):
+    method = "icmp"
+    latencies = []
+    if icmp_available():
+        latencies = probe(JITTER_TARGET, samples, JITTER_INTERVAL, 1.0, method='icmp')['rtts']
+    if len(latencies) < 2:
+        method = "keep-alive HTTP"
+        try:
+            latencies = _keepalive_latencies(samples)
+        except Exception:
+            latencies = []
+
     if len(latencies) >= 2:
-        jitter = statistics.stdev(latencies)
-        output_signal.emit(f"Jitter: {jitter:.2f} ms\n")
-        return jitter
-    return 0
-
-def test_ping(output_signal):
-    count = 10
-    cmd = ["ping", "-n" if platform.system().lower() == "windows" else "-c", str(count), "1.1.1.1"]
-    try:
-        output = subprocess.check_output(cmd, stderr=subprocess.STDOUT, timeout=45, text=True, encoding='utf-8', errors='ignore')
+        jitter = rfc3550_jitter(latencies)
+        stdev = statistics.stdev(latencies)
+        output_signal.emit(
+            f"Jitter: {jitter:.2f} ms (RFC 3550), stdev {stdev:.2f} ms "
+            f"over {len(latencies)} samples via {method}\n"
+        )
+        return jitter, stdev, latencies
+    output_signal.emit("Jitter test failed.\n")
+    return 0, 0, latencies
+
+LOADED_LATENCY_TARGET = "1.1.1.1"
+
+# (upper bound of the loaded-minus-idle RTT increase in ms, grade)
+BUFFERBLOAT_GRADES = [(5, "A+"), (30, "A"), (60, "B"), (200, "C"), (400, "D")]
+
+def loaded_latency_prober():
+    return LatencyProber(LOADED_LATENCY_TARGET)
+
+def test_idle_latency(output_signal, count=20):
+    st = probe(LOADED_LATENCY_TARGET, count, 0.05)
+    if not st['received']:
+        output_signal.emit("Idle latency probe failed.\n")
+        return 0
+    output_signal.emit(f"Idle latency: {st['p50']:.1f} ms (p50 of {st['received']} probes)\n")
+    return st['p50']
+
+def bufferbloat_grade(delta):
+    for limit, grade in BUFFERBLOAT_GRADES:
+        if delta < limit:
+            return grade
+    return "F"
 
-        sent_match = re.search(r'(\d+)\s*(پکت|packet|ارسال|transmitted|sent)', output, re.I)
-        recv_match = re.search(r'(\d+)\s*(دریافت|received|recv)', output, re.I)
-        sent = int(sent_match.group(1)) if sent_match else count
-        recv = int(recv_match.group(1)) if recv_match else 0
-        packet_loss = (sent - recv) / sent * 100 if sent > 0 else 0
+def summarize_bufferbloat(output_signal, idle, loaded_down, loaded_up):
+    # the grade follows the worse direction, as queues usually build on one side only
+    loaded = max(loaded_down or 0, loaded_up or 0)
+    if not idle or not loaded:
+        return None, None
+    delta = max(0, loaded - idle)
+    grade = bufferbloat_grade(delta)
+    output_signal.emit(
+        f"Loaded latency: down {loaded_down or 0:.1f} ms, up {loaded_up or 0:.1f} ms, "
+        f"idle {idle:.1f} ms | Bufferbloat: +{delta:.1f} ms (grade {grade})\n"
+    )
+    return delta, grade
 
-        avg_match = re.search(r'(میانگین|متوسط|Average|avg)\s*[=:]\s*(\d+\.?\d*)\s*(ms|میلی‌ثانیه)', output, re.I)
-        if avg_match:
-            avg_ping = float(avg_match.group(2))
+PING_TARGETS = ["1.1.1.1", "8.8.8.8", "9.9.9.9"]
+
+def test_ping(output_signal, targets=PING_TARGETS, count=10, method='auto'):
+    stats = probe_targets(targets, count, method=method)
+    for target, st in stats.items():
+        if st['received']:
+            output_signal.emit(
+                f"Ping {target} ({st['method']}): min/avg/p50/p95/max = "
+                f"{st['min']:.1f}/{st['avg']:.1f}/{st['p50']:.1f}/{st['p95']:.1f}/{st['max']:.1f} ms | "
+                f"Loss: {st['loss']:.1f}%\n"
+            )
         else:
-            rtt_match = re.search(r'rtt.*=\s*[\d.]+/([\d.]+)/[\d.]+/[\d.]+', output, re.I)
-            avg_ping = float(rtt_match.group(1)) if rtt_match else 9999
-            if avg_ping == 9999 and recv > 0:
-                time_matches = re.findall(r'time[=<]\s*(\d+\.?\d*)\s*ms', output, re.I)
-                if time_matches:
-                    avg_ping = sum(float(t) for t in time_matches) / len(time_matches)
-
-        output_signal.emit(f"Ping results: Sent {sent}, Received {recv}\nAverage ping: {avg_ping:.1f} ms | Packet Loss: {packet_loss:.2f}%\n")
-        return avg_ping if avg_ping < 9999 else 0, packet_loss
-    except:
+            output_signal.emit(f"Ping {target} ({st['method']}): no replies\n")
+
+    answered = [st for st in stats.values() if st['received']]
+    if not answered:
         output_signal.emit("Ping failed.\n")
-        return 0, 100
+        return 0, 100, stats
+    # the closest responsive target stands for the connection, like the old 1.1.1.1 ping
+    best = min(answered, key=lambda st: st['p50'])
+    output_signal.emit(f"Average ping: {best['avg']:.1f} ms | Packet Loss: {best['loss']:.2f}%\n")
+    return best['avg'], best['loss'], stats
 
-def test_dns(output_signal):
-    dns_server = get_system_dns()
-    dns_times = []
+DNS_RESOLVERS = ["1.1.1.1", "8.8.8.8", "9.9.9.9"]
+DNS_DOMAINS = ["google.com", "cloudflare.com", "wikipedia.org", "github.com", "amazon.com"]
+DNS_TIMEOUT = 2.0
+DNS_PORT = 53
+
+def _timed_query(resolv, name):
+    from dns import resolver
+    start = time.perf_counter_ns()
     try:
-        resolv = resolver.Resolver()
-        resolv.nameservers = [dns_server] if dns_server != "Unknown" else ['1.1.1.1']
-        for _ in range(5):
-            try:
-                start = time.time()
-                resolv.resolve("google.com", "A")
-                dns_times.append((time.time() - start) * 1000)
-            except:
-                dns_times.append(9999)
-        if dns_times and any(t < 9999 for t in dns_times):
-            avg_dns = statistics.mean([t for t in dns_times if t < 9999])
-            output_signal.emit(f"DNS response time: {avg_dns:.1f} ms (Server: {dns_server})\n")
-            return avg_dns, dns_server
-    except:
-        output_signal.emit("DNS test failed.\n")
-    return 9999, dns_server
\ No newline at end of file
+        resolv.resolve(name, "A", raise_on_no_answer=False)
+    except resolver.NXDOMAIN:
+        pass  # a random subdomain normally doesn't exist; the answer still took a full lookup
+    return (time.perf_counter_ns() - start) / 1_000_000
+
+def _bench_resolver(server, domains):
+    from dns import resolver
+    times = {'cold': [], 'warm': []}
+    failures = {'cold': 0, 'warm': 0}
+    try:
+        resolv = resolver.Resolver(configure=False)
+        resolv.nameservers = [server]
+        resolv.port = DNS_PORT
+        resolv.lifetime = DNS_TIMEOUT
+    except ValueError:
+        # not an IP address (settings.json is hand-editable): every query counts as failed
+        failures = {'cold': len(domains), 'warm': len(domains)}
+        domains = []
+    for domain in domains:
+        # cold: a random label forces the resolver to go to the authoritative servers
+        try:
+            times['cold'].append(_timed_query(resolv, f"{random.randbytes(6).hex()}.{domain}"))
+        except Exception:
+            failures['cold'] += 1
+        # warm: the first lookup fills the resolver's cache, the second is measured
+        try:
+            _timed_query(resolv, domain)
+            times['warm'].append(_timed_query(resolv, domain))
+        except Exception:
+            failures['warm'] += 1
+
+    rows = []
+    for kind in ('cold', 'warm'):
+        ordered = sorted(times[kind])
+        rows.append({
+            'resolver': server, 'kind': kind,
+            'queries': len(ordered) + failures[kind], 'failures': failures[kind],
+            'p50': percentile(ordered, 50) if ordered else None,
+            'p95': percentile(ordered, 95) if ordered else None,
+            'samples': times[kind],
+        })
+    return rows
+
+def test_dns(output_signal, resolvers=DNS_RESOLVERS, domains=DNS_DOMAINS):
+    dns_server = get_system_dns()
+    system = dns_server if dns_server != "Unknown" else None
+    # a resolver listed twice would be benchmarked against itself in parallel
+    servers = list(dict.fromkeys(([system] if system else []) + list(resolvers)))
+    for server in [s for s in servers if not is_resolver_address(s)]:
+        output_signal.emit(f"DNS {server}: not an IP address, skipped\n")
+        servers.remove(server)
+    if not servers:
+        output_signal.emit("DNS test failed: no resolvers to test.\n")
+        return 9999, dns_server, []
+
+    with ThreadPoolExecutor(max_workers=len(servers)) as pool:
+        futures = [pool.submit(_bench_resolver, server, domains) for server in servers]
+    rows = []
+    for future in futures:
+        for row in future.result():
+            row['is_system'] = row['resolver'] == system
+            rows.append(row)
+
+    for row in rows:
+        label = f"{row['resolver']}{' (system)' if row['is_system'] else ''}"
+        if row['p50'] is None:
+            output_signal.emit(f"DNS {label} {row['kind']}: failed\n")
+        else:
+            output_signal.emit(
+                f"DNS {label} {row['kind']}: p50 {row['p50']:.1f} ms, p95 {row['p95']:.1f} ms "
+                f"({row['failures']}/{row['queries']} failed)\n"
+            )
+
+    # the headline number stays the system resolver's warm lookup time, as before
+    headline = next((r for r in rows if r['kind'] == 'warm' and (r['is_system'] or not system)), None)
+    if headline and headline['p50'] is not None:
+        output_signal.emit(f"DNS response time: {headline['p50']:.1f} ms (Server: {dns_server})\n")
+        return headline['p50'], dns_server, rows
+    output_signal.emit("DNS test failed.\n")
+    return 9999, dns_server, rows
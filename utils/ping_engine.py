@@ -0,0 +1,217 @@
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+TCP_PROBE_PORT = 443
+UDP_PROBE_PORT = 53
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+def _icmp_socket():
+    # unprivileged ICMP "ping sockets" (Linux with ping_group_range, macOS)
+    return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+
+def icmp_available():
+    try:
+        _icmp_socket().close()
+        return True
+    except OSError:
+        return False
+
+def _icmp_probe(target, count, interval, timeout):
+    token = os.urandom(8)
+    ident = int.from_bytes(os.urandom(2), "big")
+    addr = socket.gethostbyname(target)
+    sent_at = {}
+    rtts = {}
+
+    with _icmp_socket() as sock:
+        sock.setblocking(False)
+        next_send = time.perf_counter()
+        seq = 0
+        deadline = None
+        while True:
+            now = time.perf_counter()
+            if seq < count and now >= next_send:
+                header = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+                packet = struct.pack("!BBHHH", ICMP_ECHO_REQUEST, 0, _checksum(header + token), ident, seq) + token
+                sent_at[seq] = time.perf_counter_ns()
+                sock.sendto(packet, (addr, 0))
+                seq += 1
+                next_send = now + interval
+                if seq == count:
+                    deadline = now + timeout
+            if deadline is not None and (now >= deadline or len(rtts) == count):
+                break
+
+            wait = (deadline if seq == count else next_send) - time.perf_counter()
+            ready, _, _ = select.select([sock], [], [], max(0, wait))
+            if not ready:
+                continue
+            data = sock.recv(1024)
+            received = time.perf_counter_ns()
+            # macOS hands back the IP header as well, Linux only the ICMP message
+            if data and data[0] >> 4 == 4:
+                data = data[(data[0] & 0x0F) * 4:]
+            if len(data) < 16:
+                continue
+            kind, _, _, _, reply_seq = struct.unpack("!BBHHH", data[:8])
+            if kind == ICMP_ECHO_REPLY and data[8:16] == token and reply_seq in sent_at:
+                rtts.setdefault(reply_seq, (received - sent_at[reply_seq]) / 1_000_000)
+
+    return [rtts[s] for s in sorted(rtts)], count
+
+def _tcp_probe(target, count, interval, timeout, port=None):
+    # connect() returns after one SYN / SYN-ACK (or RST) round trip
+    addr = socket.gethostbyname(target)
+    port = port or TCP_PROBE_PORT
+    rtts = []
+    for i in range(count):
+        start = time.perf_counter_ns()
+        try:
+            with socket.create_connection((addr, port), timeout=timeout):
+                rtts.append((time.perf_counter_ns() - start) / 1_000_000)
+        except ConnectionRefusedError:
+            rtts.append((time.perf_counter_ns() - start) / 1_000_000)
+        except OSError:
+            pass
+        if i < count - 1:
+            time.sleep(interval)
+    return rtts, count
+
+def _udp_probe(target, count, interval, timeout, port=None):
+    # a minimal DNS query for the root NS record; only meaningful against resolvers
+    addr = socket.gethostbyname(target)
+    port = port or UDP_PROBE_PORT
+    rtts = []
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        for i in range(count):
+            query_id = int.from_bytes(os.urandom(2), "big")
+            query = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0) + b"\0" + struct.pack("!HH", 2, 1)
+            start = time.perf_counter_ns()
+            sock.sendto(query, (addr, port))
+            try:
+                while True:
+                    data = sock.recv(512)
+                    if data[:2] == query_id.to_bytes(2, "big"):
+                        rtts.append((time.perf_counter_ns() - start) / 1_000_000)
+                        break
+            except OSError:
+                pass
+            if i < count - 1:
+                time.sleep(interval)
+    return rtts, count
+
+PROBES = {'icmp': _icmp_probe, 'tcp': _tcp_probe, 'udp': _udp_probe}
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0
+    k = (len(ordered) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+def rtt_stats(rtts, sent):
+    ordered = sorted(rtts)
+    return {
+        'sent': sent,
+        'received': len(rtts),
+        'loss': (sent - len(rtts)) / sent * 100 if sent else 100,
+        'min': ordered[0] if ordered else 0,
+        'avg': sum(ordered) / len(ordered) if ordered else 0,
+        'p50': percentile(ordered, 50),
+        'p95': percentile(ordered, 95),
+        'max': ordered[-1] if ordered else 0,
+        'rtts': rtts,
+    }
+
+def rfc3550_jitter(rtts):
+    # interarrival jitter from RFC 3550 section 6.4.1; for round trips the transit
+    # difference D(i-1, i) is simply the change in RTT between consecutive samples
+    jitter = 0.0
+    for prev, cur in zip(rtts, rtts[1:]):
+        jitter += (abs(cur - prev) - jitter) / 16
+    return jitter
+
+def _run_probe(method, target, count, interval, timeout):
+    try:
+        rtts, sent = PROBES[method](target, count, interval, timeout)
+    except OSError:
+        rtts, sent = [], count
+    stats = rtt_stats(rtts, sent)
+    stats['method'] = method
+    return stats
+
+def probe(target, count=10, interval=0.2, timeout=2.0, method='auto'):
+    # 'auto' uses ICMP when the OS allows unprivileged ping sockets and falls back
+    # to TCP connects when it doesn't or when ICMP is filtered on the path
+    if method != 'auto':
+        return _run_probe(method, target, count, interval, timeout)
+    if icmp_available():
+        stats = _run_probe('icmp', target, count, interval, timeout)
+        if stats['received']:
+            return stats
+    return _run_probe('tcp', target, count, interval, timeout)
+
+def probe_targets(targets, count=10, interval=0.2, timeout=2.0, method='auto'):
+    with ThreadPoolExecutor(max_workers=len(targets)) as pool:
+        futures = {t: pool.submit(probe, t, count, interval, timeout, method) for t in targets}
+    return {t: f.result() for t, f in futures.items()}
+
+class LatencyProber:
+    # background prober for latency under load: one probe every `interval` seconds
+    # between start() and stop(), each run starting from an empty sample list
+    def __init__(self, target, interval=0.1, timeout=1.0, method='auto'):
+        self.target = target
+        self.interval = interval
+        self.timeout = timeout
+        self.method = method
+        self.rtts = []
+        self.sent = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.method == 'auto':
+            self.method = 'icmp' if icmp_available() and probe(self.target, 1, 0, self.timeout, 'icmp')['received'] else 'tcp'
+        self.rtts = []
+        self.sent = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.timeout + self.interval)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            try:
+                rtts, sent = PROBES[self.method](self.target, 1, 0, self.timeout)
+            except OSError:
+                rtts, sent = [], 1
+            self.rtts.extend(rtts)
+            self.sent += sent
+            self._stop.wait(max(0, self.interval - (time.perf_counter() - started)))
+
+    def stats(self):
+        stats = rtt_stats(list(self.rtts), self.sent)
+        stats['method'] = self.method
+        return stats
@@ -0,0 +1,50 @@
+import math
+from datetime import datetime, timedelta
+from database import get_server_health
+
+SKIP_SUCCESS_RATE = 0.2          # below this an endpoint is skipped...
+SKIP_MIN_ATTEMPTS = 3            # ...once it has had a fair number of tries
+RETRY_SKIPPED_AFTER = timedelta(hours=12)
+HEALTH_BAND = 0.25               # success rates rounding to the same quarter count as equally reliable
+UNKNOWN_SUCCESS_RATE = 0.5       # where an endpoint without history sits
+
+def order_servers(kind, servers, key=lambda s: s[1]):
+    # sorts candidates by their stored health (success rate, then throughput, then
+    # latency); endpoints that keep failing are skipped until RETRY_SKIPPED_AFTER
+    # has passed, then retried at the bottom of the list
+    health = get_server_health(kind)
+    now = datetime.now()
+    healthy, retry = [], []
+
+    for server in servers:
+        h = health.get(key(server))
+        if h and h['attempts'] >= SKIP_MIN_ATTEMPTS and h['success_rate'] < SKIP_SUCCESS_RATE:
+            if now - datetime.fromisoformat(h['last_checked']) >= RETRY_SKIPPED_AFTER:
+                retry.append(server)
+            continue
+        healthy.append(server)
+
+    def score(server):
+        h = health.get(key(server))
+        if not h:
+            # unknown endpoints sit between proven good ones and flaky ones
+            return (-0.5, 0, 0)
+        return (-h['success_rate'], -(h['throughput'] or 0), h['latency'] or 0)
+
+    healthy.sort(key=score)
+    ordered = healthy + retry
+    return ordered or list(servers)
+
+def health_band(kind):
+    # coarse health per url, for sorting together with a live probe: success rate
+    # in quarters first, then throughput within a factor of two; differences
+    # finer than that are left to the probe RTT
+    health = get_server_health(kind)
+
+    def band(url):
+        h = health.get(url)
+        if not h:
+            return (-round(UNKNOWN_SUCCESS_RATE / HEALTH_BAND), 0)
+        throughput = h['throughput'] or 0
+        return (-round(h['success_rate'] / HEALTH_BAND), -int(math.log2(throughput)) if throughput >= 1 else 0)
+    return band
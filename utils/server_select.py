@@ -0,0 +1,48 @@
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+from . import http_session
+
+PROBE_DEADLINE = 2.0
+PROBE_DRAIN_LIMIT = 65536
+
+def _probe(url, deadline):
+    # TCP connect gives the RTT, a one-byte ranged GET proves the server answers HTTP
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    start = time.perf_counter()
+    with socket.create_connection((parts.hostname, port), timeout=deadline):
+        rtt = (time.perf_counter() - start) * 1000
+    r = http_session.get(url, headers={"Range": "bytes=0-0"}, stream=True, timeout=deadline)
+    # a small body is drained so the warm connection goes back to the shared pool
+    # for the bandwidth test; a 200 that ignores Range, or one of unknown length
+    # (chunked), may be the whole file and gets its connection closed instead
+    length = r.headers.get("Content-Length", "")
+    if r.status_code == 206 or (length.isdigit() and int(length) <= PROBE_DRAIN_LIMIT):
+        r.content
+    r.close()
+    # POST-only endpoints answer GET with 405, which still means the host is up
+    if r.status_code >= 500:
+        raise RuntimeError(f"HTTP {r.status_code}")
+    return rtt
+
+def rank_servers(servers, deadline=PROBE_DEADLINE, band=None):
+    # probes every (name, url) at once and returns the reachable ones as
+    # (name, url, rtt_ms) sorted by band(url) (stored health, if given) and then
+    # RTT; if nothing answers in time the original order is kept so the caller
+    # still has something to try
+    pool = ThreadPoolExecutor(max_workers=len(servers))
+    futures = {pool.submit(_probe, url, deadline): (name, url) for name, url in servers}
+    done, _ = wait(futures, timeout=deadline)
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    ranked = []
+    for future in done:
+        if future.exception() is None:
+            name, url = futures[future]
+            ranked.append((name, url, future.result()))
+    ranked.sort(key=lambda s: (band(s[1]) if band else (), s[2]))
+    if not ranked:
+        return [(name, url, None) for name, url in servers]
+    return ranked
@@ -1,37 +1,94 @@
-import requests
+import json
+import time
 import webbrowser
 from packaging import version
-from PyQt6.QtWidgets import QMessageBox
+from utils import http_session
 from config import BASE_DIR
 
-def check_for_updates(parent=None, silent=False):
+RELEASES_URL = "https://api.github.com/repos/salmandostkhah/fluxflow/releases/latest"
+UPDATE_CACHE_PATH = BASE_DIR / "update_cache.json"
+UPDATE_CHECK_INTERVAL = 6 * 3600    # silent checks reuse the cached release within this window
+UPDATE_TIMEOUT = 10
+
+def current_version():
+    version_path = BASE_DIR / "version.txt"
+    return version_path.read_text(encoding='utf-8').strip() if version_path.exists() else "unknown"
+
+def _load_cache():
+    try:
+        return json.loads(UPDATE_CACHE_PATH.read_text(encoding='utf-8'))
+    except Exception:
+        return {}
+
+def _save_cache(cache):
     try:
-        version_path = BASE_DIR / "version.txt"
-        current_version = version_path.read_text(encoding='utf-8').strip() if version_path.exists() else "unknown"
-
-        api_url = "https://api.github.com/repos/salmandostkhah/fluxflow/releases/latest"
-        response = requests.get(api_url, timeout=10)
-        if response.status_code != 200:
-            if not silent:
-                QMessageBox.information(parent, "آپدیت", "خطا در ارتباط با GitHub.")
-            return
-
-        data = response.json()
-        latest_version = data['tag_name'].lstrip('v')
-
-        if current_version != "unknown" and version.parse(latest_version) > version.parse(current_version):
-            reply = QMessageBox.question(
-                parent, "آپدیت موجود!",
-                f"نسخه جدید {latest_version} موجود است!\n"
-                f"نسخه فعلی: {current_version}\n\n"
-                f"تغییرات:\n{data.get('body', 'بدون توضیح')[:400]}...\n\n"
-                "باز کردن صفحه دانلود؟",
-                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-            )
-            if reply == QMessageBox.StandardButton.Yes:
-                webbrowser.open(data['html_url'])
-        elif not silent:
-            QMessageBox.information(parent, "آپدیت", f"برنامه به‌روز است (نسخه {current_version}) 😊")
+        UPDATE_CACHE_PATH.write_text(json.dumps(cache, ensure_ascii=False), encoding='utf-8')
     except Exception as e:
-        if not silent:
-            QMessageBox.warning(parent, "خطا", f"خطا در چک آپدیت: {str(e)}")
\ No newline at end of file
+        print(f"[Update] cache write failed: {e}")
+
+# network side of the update check; GUI-free so it can run on a worker thread
+def fetch_latest_release(force=False):
+    cache = _load_cache()
+    release = cache.get('release')
+    fresh = time.time() - cache.get('checked_at', 0) < UPDATE_CHECK_INTERVAL
+
+    if release and fresh and not force:
+        source = 'cache'
+    else:
+        # GitHub answers 304 for an unchanged ETag without counting it against the rate limit
+        headers = {'Accept': 'application/vnd.github+json'}
+        if release and cache.get('etag'):
+            headers['If-None-Match'] = cache['etag']
+        response = http_session.get(RELEASES_URL, headers=headers, timeout=UPDATE_TIMEOUT)
+
+        if response.status_code == 304 and release:
+            source = 'not modified'
+        elif response.status_code == 200:
+            data = response.json()
+            release = {
+                'tag_name': data['tag_name'],
+                'body': data.get('body') or '',
+                'html_url': data['html_url'],
+            }
+            cache['etag'] = response.headers.get('ETag')
+            source = 'network'
+        else:
+            raise RuntimeError(f"GitHub returned HTTP {response.status_code}")
+
+        cache['release'] = release
+        cache['checked_at'] = time.time()
+        _save_cache(cache)
+
+    current = current_version()
+    latest = release['tag_name'].lstrip('v')
+    return {
+        'current': current,
+        'latest': latest,
+        'available': current != "unknown" and version.parse(latest) > version.parse(current),
+        'notes': release['body'],
+        'url': release['html_url'],
+        'source': source,
+    }
+
+def show_update_result(parent, info, silent=False):
+    from PyQt6.QtWidgets import QMessageBox
+
+    if info['available']:
+        reply = QMessageBox.question(
+            parent, "آپدیت موجود!",
+            f"نسخه جدید {info['latest']} موجود است!\n"
+            f"نسخه فعلی: {info['current']}\n\n"
+            f"تغییرات:\n{(info['notes'] or 'بدون توضیح')[:400]}...\n\n"
+            "باز کردن صفحه دانلود؟",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            webbrowser.open(info['url'])
+    elif not silent:
+        QMessageBox.information(parent, "آپدیت", f"برنامه به‌روز است (نسخه {info['current']}) 😊")
+
+def show_update_error(parent, error, silent=False):
+    from PyQt6.QtWidgets import QMessageBox
+
+    if not silent:
+        QMessageBox.warning(parent, "خطا", f"خطا در چک آپدیت: {error}")